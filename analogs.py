@@ -0,0 +1,249 @@
+"""Historical analog search: the archive storms whose tracks most resemble a given storm.
+
+Raw IBTrACS tracks have different lengths and irregular fix times, so they
+cannot be compared point by point.  Every track is therefore resampled once,
+for the whole archive in one vectorized pass, to :data:`TRACK_POINTS`
+positions evenly spaced over the storm's lifetime (first fix to last fix).
+Positions are stored as unit vectors on the sphere, which makes the
+interpolation indifferent to the antimeridian, in a dense
+``(storms, TRACK_POINTS, 3)`` float32 matrix.
+
+The distance between two storms is the mean great-circle distance (km)
+between their corresponding resampled positions, so it grows with
+differences in both location and track shape.  A query compares one (or a
+batch of) resampled tracks with the whole matrix at once and keeps the
+closest with a partial sort.
+
+Like the storm and spatial indexes, the matrix is built once per archive,
+stored next to the column cache and rebuilt whenever the cache is.
+
+Usage::
+
+    python analogs.py --data ibtracs.ALL.list.v04r01.csv --storm "MILTON|2024" --count 10
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from extract_hurricane_data import OUTPUT_FILE
+from geometry import EARTH_RADIUS_KM
+from ibtracs_cache import CACHE_DIR, cached_artifact
+from storm_index import StormIndex, storm_entry
+
+ANALOGS_FILE = 'analog_tracks.npz'
+
+ANALOG_COLUMNS = ['SID', 'SEASON', 'ISO_TIME', 'LAT', 'LON']
+
+# Positions each track is resampled to
+TRACK_POINTS = 32
+
+# Analogs added to a map by default
+DEFAULT_ANALOG_COUNT = 5
+
+
+def unit_vectors(lon, lat):
+    """Lon/lat degrees as unit vectors ``(..., 3)`` on the sphere."""
+    lon = np.radians(np.asarray(lon, dtype=float))
+    lat = np.radians(np.asarray(lat, dtype=float))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def resample_tracks(df, points=TRACK_POINTS):
+    """Every storm's track resampled to ``points`` positions evenly spaced in time.
+
+    Returns ``(sids, seasons, tracks)``: storms in archive order (those with at
+    least one fix with a time and a position), their seasons (NaN when unknown)
+    and the ``(storms, points, 3)`` float32 unit-vector matrix.  A storm with a
+    single fix is resampled to that fix repeated.
+    """
+    codes, sids = pd.factorize(df['SID'].to_numpy())
+    seasons_by_row = df['SEASON'].to_numpy(dtype=float, na_value=np.nan)
+    times = df['ISO_TIME'].to_numpy(dtype='datetime64[ns]')
+    lat = df['LAT'].to_numpy(dtype=float, na_value=np.nan)
+    lon = df['LON'].to_numpy(dtype=float, na_value=np.nan)
+    valid = np.flatnonzero((codes >= 0) & ~np.isnat(times) & ~np.isnan(lat) & ~np.isnan(lon))
+    # Each storm's fixes as one contiguous, time-ordered block
+    order = valid[np.lexsort((times[valid], codes[valid]))]
+    if len(order) == 0:
+        return np.empty(0, dtype=str), np.empty(0), np.empty((0, points, 3), dtype='float32')
+
+    code = codes[order]
+    starts = np.flatnonzero(np.r_[True, code[1:] != code[:-1]])
+    stops = np.r_[starts[1:], len(order)]
+    storms = len(starts)
+    group = np.repeat(np.arange(storms), stops - starts)
+    minutes = times[order].astype('datetime64[m]').astype(np.int64)
+    xyz = unit_vectors(lon[order], lat[order])
+
+    # Fraction of the storm's lifetime elapsed at each fix
+    elapsed = minutes - minutes[starts][group]
+    duration = (minutes[stops - 1] - minutes[starts])[group]
+    fraction = np.divide(elapsed, duration, out=np.zeros(len(order)), where=duration > 0)
+
+    # The fixes either side of every target fraction, found with one sorted search over
+    # (storm, fraction) keys spaced so that no target spills into the next storm
+    key = group * 2.0 + fraction
+    target = np.linspace(0.0, 1.0, points)
+    first = np.repeat(starts, points)
+    last = np.repeat(stops - 1, points)
+    lo = np.clip(np.searchsorted(key, (np.arange(storms)[:, None] * 2.0 + target).ravel(), side='right') - 1,
+                 first, last)
+    hi = np.minimum(lo + 1, last)
+    span = fraction[hi] - fraction[lo]
+    weight = np.divide(np.tile(target, storms) - fraction[lo], span, out=np.zeros(len(lo)), where=span > 0)
+    weight = np.clip(weight, 0.0, 1.0)[:, None]
+
+    # Interpolate along the chord and project back onto the sphere
+    tracks = xyz[lo] * (1.0 - weight) + xyz[hi] * weight
+    tracks /= np.linalg.norm(tracks, axis=1, keepdims=True)
+    return (np.asarray(sids, dtype=str)[code[starts]], seasons_by_row[order][starts],
+            tracks.reshape(storms, points, 3).astype('float32'))
+
+
+class AnalogIndex:
+    """Resampled tracks of every storm in an archive, for nearest-track queries."""
+
+    def __init__(self, sids, seasons, tracks, rows=0, sha256=None):
+        # sids[i], seasons[i], tracks[i]: storm i in archive order
+        self.sids = sids
+        self.seasons = seasons
+        self.tracks = tracks
+        self.rows = rows
+        self.sha256 = sha256
+        self.positions = {sid: i for i, sid in enumerate(sids)}
+
+    @classmethod
+    def build(cls, df, sha256=None, points=TRACK_POINTS):
+        """Build the matrix from a frame with SID, SEASON, ISO_TIME, LAT and LON columns."""
+        sids, seasons, tracks = resample_tracks(df, points)
+        return cls(sids, seasons, tracks, len(df), sha256)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['sids'], data['seasons'], data['tracks'], meta['rows'], meta['sha256'])
+
+    def save(self, path):
+        meta = {'rows': self.rows, 'sha256': self.sha256}
+        tmp = str(path) + '.tmp.npz'
+        np.savez(tmp, meta=np.array(json.dumps(meta)), sids=self.sids, seasons=self.seasons, tracks=self.tracks)
+        os.replace(tmp, path)
+
+    @classmethod
+    def for_archive(cls, source, cache_dir=CACHE_DIR):
+        """The resampled tracks of ``source``, kept with its column cache and rebuilt with it."""
+        return cached_artifact(source, ANALOGS_FILE, ANALOG_COLUMNS, cls.build, cls.load, cache_dir=cache_dir)
+
+    def __len__(self):
+        return len(self.sids)
+
+    def __contains__(self, sid):
+        return sid in self.positions
+
+    def distances(self, tracks):
+        """Mean great-circle distance (km) from each of ``tracks`` to every storm.
+
+        ``tracks`` is one resampled track ``(points, 3)`` or a batch
+        ``(queries, points, 3)``; the result is ``(storms,)`` or ``(queries, storms)``.
+        """
+        tracks = np.asarray(tracks, dtype='float32')
+        batch = tracks.reshape(-1, *self.tracks.shape[1:])
+        # Angles from chord lengths rather than dot products, which lose precision in float32
+        chords = np.linalg.norm(self.tracks[None] - batch[:, None], axis=3)
+        km = 2 * np.arcsin(np.minimum(chords / 2, 1.0)).mean(axis=2) * EARTH_RADIUS_KM
+        return km if tracks.ndim == 3 else km[0]
+
+    def nearest(self, sid, count=DEFAULT_ANALOG_COUNT, since=None, until=None):
+        """The ``count`` storms whose tracks are closest to storm ``sid``'s, as ``[(sid, km), ...]``.
+
+        The storm itself is never its own analog; ``since`` and ``until`` limit
+        the analogs to those seasons.
+        """
+        if sid not in self.positions:
+            raise ValueError(f"Storm {sid} has no track in the archive")
+        km = self.distances(self.tracks[self.positions[sid]])
+        eligible = np.ones(len(km), dtype=bool)
+        eligible[self.positions[sid]] = False
+        with np.errstate(invalid='ignore'):
+            if since is not None:
+                eligible &= self.seasons >= since
+            if until is not None:
+                eligible &= self.seasons <= until
+        candidates = np.flatnonzero(eligible)
+        count = min(count, len(candidates))
+        if count <= 0:
+            return []
+        closest = candidates[np.argpartition(km[candidates], count - 1)[:count]]
+        closest = closest[np.argsort(km[closest], kind='stable')]
+        return [(str(self.sids[i]), float(km[i])) for i in closest]
+
+
+def analog_entries(analog_index, archive_index, sid, count=DEFAULT_ANALOG_COUNT, since=None, until=None):
+    """Entries like those in the visualization's ``hurricanes`` list for the analogs of storm ``sid``.
+
+    Each entry carries ``analog_of`` (the storm's name and season) and
+    ``analog_km`` (mean track distance) for the map's panel and popups.
+    """
+    name, season = archive_index.storms[sid]
+    entries = []
+    for analog, km in analog_index.nearest(sid, count, since, until):
+        analog_name, analog_season = archive_index.storms[analog]
+        entries.append({'name': analog_name, 'year': analog_season, 'sid': analog,
+                        'analog_of': f"{name} ({season})", 'analog_km': round(km)})
+    return entries
+
+
+def positive_int(value):
+    """argparse type for counts: an integer of at least 1."""
+    count = int(value)
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {count}")
+    return count
+
+
+def add_analog_arguments(parser):
+    """Add the ``--analogs`` and ``--analog-count`` options to ``parser``."""
+    group = parser.add_argument_group('historical analogs')
+    group.add_argument('--analogs', metavar='STORM',
+                       help='also map STORM (NAME|YEAR or storm ID) and the storms whose tracks most resemble it; '
+                            '--since/--until limit the analogs to those seasons')
+    group.add_argument('--analog-count', type=positive_int, default=DEFAULT_ANALOG_COUNT,
+                       help=f'number of analogs to map (default {DEFAULT_ANALOG_COUNT})')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the storms whose tracks most resemble a given storm.')
+    parser.add_argument('--data', default=OUTPUT_FILE, help='IBTrACS or extracted CSV file to search')
+    parser.add_argument('--storm', required=True, help='storm to find analogs of, as NAME|YEAR or a storm ID')
+    parser.add_argument('--count', type=positive_int, default=DEFAULT_ANALOG_COUNT, help='number of analogs to list')
+    parser.add_argument('--since', type=int, help='first season to include')
+    parser.add_argument('--until', type=int, help='last season to include')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    analog_index = AnalogIndex.for_archive(args.data)
+    storm_index = StormIndex.for_archive(args.data)
+    print(f"Resampled tracks of {len(analog_index)} storms ready in {time.perf_counter() - start:.2f}s")
+
+    try:
+        storm = storm_entry(args.storm, storm_index)
+        sid = storm.get('sid') or storm_index.resolve(storm['name'], storm['year'])
+    except (ValueError, LookupError) as e:
+        parser.error(e.args[0])
+
+    start = time.perf_counter()
+    analogs = analog_index.nearest(sid, args.count, args.since, args.until)
+    elapsed = (time.perf_counter() - start) * 1000
+    for sid, km in analogs:
+        name, season = storm_index.storms[sid]
+        print(f"{sid}  {name} ({season})  {km:,.0f} km")
+    print(f"{len(analogs)} analogs found in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""Time-animated playback of the mapped storms from precomputed frames.
+
+All mapped storms share one time axis of :data:`FRAME_MINUTES` buckets,
+starting at the first bucket of the earliest storm.  Each storm's position at
+every bucket it is active in is interpolated from its fixes, for all storms
+at once: the fixes are sorted by storm and time, the fixes either side of each
+bucket are found with one sorted search, and longitudes are unwrapped per
+storm so tracks crossing the antimeridian move smoothly.
+
+The frames are stored column-wise rather than frame by frame: for each storm
+its first bucket and number of buckets, and for all storms together one
+encoded coordinate array (see :mod:`track_encoding`) and one category array.
+Storms only have frames while they are active, so the page grows with the
+number of observations, not with frames times storms.
+
+In the page, :data:`ANIMATION_JS` creates one marker and one trail per storm
+once; each tick only moves the markers of active storms (interpolating
+between buckets, so playback is smooth at :data:`PLAYBACK_FPS`) and appends
+the buckets passed since the last tick to their trails.  Stretches with no
+active storm, such as the gaps between seasons, are skipped.
+"""
+import folium
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+from jinja2.utils import htmlsafe_json_dumps
+
+from geometry import wrap_longitude
+from storm_layers import NumpyEncoder, cat_colors
+from track_encoding import encode_coordinates
+
+# Width of one time bucket
+FRAME_MINUTES = 3 * 60
+
+# Page redraws per second while playing
+PLAYBACK_FPS = 30
+
+# Buckets played per second at 1x speed (one day per second with 3-hour buckets)
+BUCKETS_PER_SECOND = 8
+
+
+def animation_frames(df, archive_index, sids, frame_minutes=FRAME_MINUTES):
+    """The animation payload for storms ``sids`` of the archive frame ``df``.
+
+    ``first[i]`` and ``count[i]`` give storm ``sids[i]``'s range of buckets on the
+    shared axis, which starts at ``t0`` and advances ``step`` minutes per bucket;
+    its positions and categories are entries ``offset[i]:offset[i] + count[i]`` of
+    ``coords`` and ``cat``, where ``offset`` is the running sum of ``count``.
+    """
+    lengths = np.array([sum(stop - start for start, stop in archive_index.runs[sid]) for sid in sids], dtype=np.int64)
+    rows = (np.concatenate([archive_index.row_positions(sid) for sid in sids]) if len(sids)
+            else np.empty(0, dtype=np.int64))
+    group = np.repeat(np.arange(len(sids)), lengths)
+    # Select the storms' rows first, so only they are converted rather than whole archive columns
+    tracks = df.iloc[rows]
+    times = tracks['ISO_TIME'].to_numpy(dtype='datetime64[ns]')
+    lat = tracks['LAT'].to_numpy(dtype=float, na_value=np.nan)
+    lon = tracks['LON'].to_numpy(dtype=float, na_value=np.nan)
+    category = tracks['USA_SSHS'].fillna(-3).to_numpy(dtype=int)
+
+    valid = np.flatnonzero(~np.isnat(times) & ~np.isnan(lat) & ~np.isnan(lon))
+    order = valid[np.lexsort((times[valid], group[valid]))]
+    group, lat, lon, category = group[order], lat[order], lon[order], category[order]
+    minutes = times[order].astype('datetime64[m]').astype(np.int64)
+
+    payload = {'step': frame_minutes, 'sids': list(sids), 'colors': {str(c): color for c, color in cat_colors.items()}}
+    if len(order) == 0:
+        payload.update({'t0': None, 'frames': 0, 'first': [0] * len(sids), 'count': [0] * len(sids),
+                        'coords': encode_coordinates([], []), 'cat': []})
+        return payload
+
+    fixes = np.bincount(group, minlength=len(sids))
+    starts = np.cumsum(fixes) - fixes
+    stops = starts + fixes
+    present = fixes > 0
+
+    # Longitudes unwrapped within each storm, so no step jumps across the antimeridian
+    steps = np.r_[0.0, wrap_longitude(np.diff(lon))]
+    steps[starts[present]] = 0.0
+    travelled = np.cumsum(steps)
+    lon = lon[starts[group]] + travelled - travelled[starts[group]]
+
+    # Buckets each storm is active in: from the bucket holding its first fix to the one holding
+    # its last, so every storm with a fix has at least one, even if all its fixes share a bucket
+    axis_start = minutes.min() // frame_minutes * frame_minutes
+    first = np.zeros(len(sids), dtype=np.int64)
+    last = np.full(len(sids), -1, dtype=np.int64)
+    first[present] = (minutes[starts[present]] - axis_start) // frame_minutes
+    last[present] = (minutes[stops[present] - 1] - axis_start) // frame_minutes
+    count = np.maximum(last - first + 1, 0)
+
+    # Bucket times of every storm, and the fixes either side of each, found with one
+    # sorted search over (storm, time) keys spaced so no bucket spills into the next storm
+    storm = np.repeat(np.arange(len(sids)), count)
+    bucket = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count) + first[storm]
+    target = axis_start + bucket * frame_minutes
+    stride = int(minutes.max() - axis_start) + 1
+    key = group * stride + (minutes - axis_start)
+    lo = np.clip(np.searchsorted(key, storm * stride + (target - axis_start), side='right') - 1,
+                 starts[storm], stops[storm] - 1)
+    hi = np.minimum(lo + 1, stops[storm] - 1)
+    span = minutes[hi] - minutes[lo]
+    # A first bucket starting before the storm's first fix shows it at that fix
+    weight = np.clip(np.divide(target - minutes[lo], span, out=np.zeros(len(lo)), where=span > 0), 0.0, 1.0)
+
+    payload.update({
+        't0': str(np.datetime64(int(axis_start), 'm')).replace('T', ' '),
+        'frames': int(last.max() + 1),
+        'first': first.tolist(),
+        'count': count.tolist(),
+        'coords': encode_coordinates(lon[lo] + (lon[hi] - lon[lo]) * weight, lat[lo] + (lat[hi] - lat[lo]) * weight),
+        'cat': category[lo].tolist(),
+    })
+    return payload
+
+
+class AnimationLayer(MacroElement):
+    """Playback of an :func:`animation_frames` payload, with its controls, drawn in the page."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = hurricaneAnimation.create(
+            {{ this._parent.get_name() }}, {{ this.payload_json }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, payload):
+        super().__init__()
+        self._name = 'AnimationLayer'
+        self.payload_json = str(htmlsafe_json_dumps(payload, cls=NumpyEncoder, sort_keys=True))
+
+
+# Playback controls, placed at the bottom centre of the page
+ANIMATION_CONTROLS_HTML = '''
+<div id="hurricane-animation" style="position: fixed;
+    bottom: 20px; left: 50%; transform: translateX(-50%);
+    z-index:9999; font-size:12px; background-color:white;
+    padding:8px 10px; border-radius:5px; border:1px solid gray; opacity:0.9;
+    display: flex; align-items: center; gap: 8px;">
+    <button id="hurricane-animation-play" style="width: 60px;">Play</button>
+    <input id="hurricane-animation-slider" type="range" min="0" max="0" value="0" step="1" style="width: 320px;">
+    <span id="hurricane-animation-time" style="font-family: monospace; width: 120px;"></span>
+    <select id="hurricane-animation-speed">
+        <option value="0.5">0.5x</option>
+        <option value="1" selected>1x</option>
+        <option value="2">2x</option>
+        <option value="4">4x</option>
+        <option value="8">8x</option>
+    </select>
+    <label><input id="hurricane-animation-tracks" type="checkbox"> Full tracks</label>
+</div>
+'''
+
+# Shared playback code, added to the page header once; expects STORM_LAYER_JS before it
+ANIMATION_JS = """
+<script>
+var hurricaneAnimation = {
+    fps: """ + str(PLAYBACK_FPS) + """,
+    bucketsPerSecond: """ + str(BUCKETS_PER_SECOND) + """,
+    create: function(map, anim) {
+        var latlngs = hurricaneDecodeCoordinates(anim.coords);
+        var layer = L.layerGroup().addTo(map);
+        var offset = 0;
+        var storms = anim.sids.map(function(sid, s) {
+            var info = hurricaneStorms[sid] || {name: sid, year: ''};
+            var storm = {
+                first: anim.first[s], count: anim.count[s], offset: offset, shown: 0, moving: false,
+                trail: L.polyline([], {color: 'black', weight: 3, opacity: 0.7, interactive: false}),
+                marker: L.circleMarker([0, 0], {radius: 7, color: 'black', weight: 1, fill: true, fillOpacity: 0.9})
+                    .bindTooltip(info.name + ' (' + info.year + ')')
+            };
+            offset += storm.count;
+            return storm;
+        });
+        // Storms in order of their first bucket, so each tick only visits started storms
+        var byStart = storms.filter(function(storm) { return storm.count > 0; })
+            .sort(function(a, b) { return a.first - b.first; });
+        var started = 0, active = [], position = -1;
+        var t0 = anim.t0 === null ? 0 : Date.parse(anim.t0.replace(' ', 'T') + 'Z');
+
+        function reset() {
+            layer.clearLayers();
+            storms.forEach(function(storm) { storm.trail.setLatLngs([]); storm.shown = 0; storm.moving = false; });
+            started = 0;
+            active = [];
+        }
+
+        // Show every storm as it is at (fractional) bucket ``target``; moving forward only
+        // touches active storms, moving back rebuilds from the start
+        function draw(target) {
+            if (target < position) { reset(); }
+            position = target;
+            var bucket = Math.floor(target), fraction = target - bucket;
+            while (started < byStart.length && byStart[started].first <= bucket) {
+                var storm = byStart[started++];
+                storm.trail.addTo(layer);
+                active.push(storm);
+            }
+            active = active.filter(function(storm) {
+                var k = bucket - storm.first, end = storm.count - 1, shown = Math.min(k, end) + 1;
+                // Usually one new bucket per tick; after a seek the trail is set in one go
+                if (shown === storm.shown + 1) {
+                    storm.trail.addLatLng(latlngs[storm.offset + storm.shown]);
+                } else if (shown > storm.shown) {
+                    storm.trail.setLatLngs(latlngs.slice(storm.offset, storm.offset + shown));
+                }
+                storm.shown = Math.max(storm.shown, shown);
+                if (k > end || (k === end && fraction > 0)) {
+                    // Past the last bucket: the trail stays, the marker goes
+                    if (storm.moving) { layer.removeLayer(storm.marker); storm.moving = false; }
+                    return false;
+                }
+                var a = latlngs[storm.offset + k], b = latlngs[storm.offset + Math.min(k + 1, end)];
+                storm.marker.setLatLng([a[0] + (b[0] - a[0]) * fraction, a[1] + (b[1] - a[1]) * fraction]);
+                storm.marker.setStyle({fillColor: anim.colors[anim.cat[storm.offset + k]] || 'gray'});
+                if (!storm.moving) { storm.marker.addTo(layer); storm.moving = true; }
+                return true;
+            });
+            slider.value = bucket;
+            label.textContent = new Date(t0 + target * anim.step * 60000).toISOString().slice(0, 16).replace('T', ' ');
+        }
+
+        var play = document.getElementById('hurricane-animation-play');
+        var slider = document.getElementById('hurricane-animation-slider');
+        var label = document.getElementById('hurricane-animation-time');
+        var speed = document.getElementById('hurricane-animation-speed');
+        var tracks = document.getElementById('hurricane-animation-tracks');
+        var last = Math.max(anim.frames - 1, 0), playing = false, previous = null;
+        slider.max = last;
+
+        function showTracks(show) {
+            Object.keys(hurricaneStorms).forEach(function(sid) {
+                var group = hurricaneStorms[sid].group;
+                if (group) { show ? group.addTo(map) : map.removeLayer(group); }
+            });
+        }
+
+        function tick(now) {
+            if (!playing) { return; }
+            if (previous === null || now - previous >= 1000 / hurricaneAnimation.fps) {
+                var elapsed = previous === null ? 0 : (now - previous) / 1000;
+                previous = now;
+                var target = Math.min(position + elapsed * hurricaneAnimation.bucketsPerSecond * Number(speed.value), last);
+                // Skip the gaps between seasons, when no storm is active
+                if (active.length === 0 && started < byStart.length) { target = Math.max(target, byStart[started].first); }
+                draw(target);
+                if (target >= last) { playing = false; play.textContent = 'Play'; return; }
+            }
+            requestAnimationFrame(tick);
+        }
+
+        play.addEventListener('click', function() {
+            playing = !playing;
+            play.textContent = playing ? 'Pause' : 'Play';
+            if (playing) {
+                if (position >= last) { draw(0); }
+                previous = null;
+                requestAnimationFrame(tick);
+            }
+        });
+        slider.addEventListener('input', function() { draw(Number(slider.value)); });
+        tracks.addEventListener('change', function() { showTracks(tracks.checked); });
+
+        // The replay starts with the full tracks hidden and every storm at its first bucket
+        showTracks(false);
+        draw(0);
+        return layer;
+    }
+};
+</script>
+"""
+
+
+def add_animation(hurricane_map, payload):
+    """Add the playback code, the controls and the animation of ``payload`` to ``hurricane_map``."""
+    hurricane_map.get_root().header.add_child(folium.Element(ANIMATION_JS))
+    hurricane_map.get_root().html.add_child(folium.Element(ANIMATION_CONTROLS_HTML))
+    AnimationLayer(payload).add_to(hurricane_map)
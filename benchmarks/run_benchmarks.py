@@ -0,0 +1,240 @@
+"""Benchmark extraction and map building on synthetic IBTrACS archives.
+
+For every scale (number of storms) a synthetic archive is generated with
+:mod:`synthetic_ibtracs` and each stage is run ``--repeats`` times, each in a
+fresh process, recording the median wall time, CPU time and peak resident
+memory, plus the HTML size for the map stages:
+
+- ``extract_stream``: ``extract_hurricane_data.py --stream``
+- ``extract_cold``: ``extract_hurricane_data.py`` with an empty column cache
+- ``extract_warm``: ``extract_hurricane_data.py`` with the cache in place
+- ``visualize``: ``multi_hurricane_visualization_final.py`` (the default storm list)
+- ``visualize_all``: ``build_map`` over every storm in the archive (up to ``--max-map-storms``)
+
+Results are written as JSON and compared with a stored baseline; a stage that
+got slower, bigger or hungrier than ``--tolerance`` allows is reported as a
+regression and the run exits with status 1.  Times also get an absolute
+allowance of :data:`MIN_SECONDS_DELTA`, so sub-second stages do not flap on
+scheduling noise.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --scales 10 100 1000 10000
+    python benchmarks/run_benchmarks.py --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.join(REPO_ROOT, 'benchmarks')
+sys.path.insert(0, REPO_ROOT)
+
+# Everything heavy (generation included) runs in child processes: Linux children inherit
+# the parent's peak RSS, so the runner itself must stay small for the measurements to hold
+GENERATOR_SCRIPT = os.path.join(BENCHMARK_DIR, 'synthetic_ibtracs.py')
+EXTRACT_SCRIPT = os.path.join(REPO_ROOT, 'extract_hurricane_data.py')
+VISUALIZER_SCRIPT = os.path.join(REPO_ROOT, 'multi_hurricane_visualization_final.py')
+
+DEFAULT_SCALES = [10, 100, 1000, 10000]
+STAGES = ['extract_stream', 'extract_cold', 'extract_warm', 'visualize', 'visualize_all']
+
+WORK_DIR = os.path.join(BENCHMARK_DIR, 'data')
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, 'results.json')
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+# Metrics compared against the baseline
+METRICS = ['seconds', 'peak_rss_bytes', 'html_bytes']
+# Seconds allowed on top of the relative tolerance: process start-up and scheduling
+# noise alone move sub-second stages by more than 25%
+MIN_SECONDS_DELTA = 0.25
+
+# Runs of every stage; the median of each measurement is recorded
+DEFAULT_REPEATS = 3
+
+
+def _run(command, cwd, log_file):
+    """Run ``command`` in a child process; returns its wall time, CPU time and peak RSS."""
+    with open(log_file, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives this child's own resource usage, unlike RUSAGE_CHILDREN which is a running maximum
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        with open(log_file) as log:
+            tail = log.read()[-2000:]
+        raise RuntimeError(f"{' '.join(command)} failed with status {process.returncode}:\n{tail}")
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return {
+        'seconds': round(seconds, 4),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 4),
+        'peak_rss_bytes': int(peak_rss),
+    }
+
+
+def _stage_command(stage, data_file, work_dir, max_map_storms):
+    """Command line and HTML output file (or None) of one stage."""
+    extract_output = os.path.join(work_dir, 'extracted.csv')
+    if stage == 'extract_stream':
+        return [sys.executable, EXTRACT_SCRIPT, '--source', data_file, '--output', extract_output, '--stream'], None
+    if stage in ('extract_cold', 'extract_warm'):
+        return [sys.executable, EXTRACT_SCRIPT, '--source', data_file, '--output', extract_output], None
+    if stage == 'visualize':
+        html = os.path.join(work_dir, 'map.html')
+        return [sys.executable, VISUALIZER_SCRIPT, '--data', data_file, '--output', html], html
+    if stage == 'visualize_all':
+        html = os.path.join(work_dir, 'map_all.html')
+        return [sys.executable, os.path.abspath(__file__), '--map-all', data_file, html,
+                '--max-map-storms', str(max_map_storms)], html
+    raise ValueError(f"Unknown stage {stage!r}")
+
+
+def map_all(data_file, output_file, max_storms):
+    """The ``visualize_all`` stage: one map of the archive's first ``max_storms`` storms."""
+    from multi_hurricane_visualization_final import build_map, load_archive
+
+    archive = load_archive(data_file)
+    sids = list(archive[1].runs)[:max_storms]
+    with open(output_file, 'wb') as f:
+        f.write(build_map(sids, archive=archive))
+
+
+def _median_run(command, cwd, log_file, repeats, before=None):
+    """Run ``command`` ``repeats`` times, calling ``before`` ahead of each; the median of each measurement."""
+    samples = []
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        samples.append(_run(command, cwd, log_file))
+    return {key: type(samples[0][key])(statistics.median(sample[key] for sample in samples)) for key in samples[0]}
+
+
+def run_scale(storms, stages, work_dir, seed, max_map_storms, regenerate=False, repeats=DEFAULT_REPEATS):
+    """Generate (or reuse) the archive for ``storms`` storms and run ``stages`` on it."""
+    scale_dir = os.path.join(work_dir, f"storms-{storms}")
+    os.makedirs(scale_dir, exist_ok=True)
+    data_file = os.path.join(scale_dir, f"synthetic-{storms}-seed{seed}.csv")
+
+    result = {'storms': storms}
+    if regenerate or not os.path.exists(data_file):
+        command = [sys.executable, GENERATOR_SCRIPT, '--storms', str(storms), '--output', data_file, '--seed', str(seed)]
+        measured = _run(command, scale_dir, os.path.join(scale_dir, 'generate.log'))
+        print(f"  generated {data_file} in {measured['seconds']:.1f}s")
+    with open(data_file) as f:
+        result['rows'] = sum(1 for _ in f) - 2
+    result['csv_bytes'] = os.path.getsize(data_file)
+
+    # Every extract_cold run starts without a cache; the stages after it use the cache it builds
+    cache_dir = os.path.join(scale_dir, '.ibtracs_cache')
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    result['stages'] = {}
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        command, html = _stage_command(stage, data_file, scale_dir, max_map_storms)
+        measured = _median_run(command, scale_dir, os.path.join(scale_dir, f"{stage}.log"), repeats,
+                               before=clear_cache if stage == 'extract_cold' else None)
+        if html is not None:
+            measured['html_bytes'] = os.path.getsize(html)
+        result['stages'][stage] = measured
+        print(f"  {stage:<15} {measured['seconds']:>8.2f}s  {measured['peak_rss_bytes'] / 2**20:>8.1f} MB"
+              + (f"  {measured['html_bytes'] / 1024:>9.1f} KB html" if 'html_bytes' in measured else ''))
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline`` as ``(scale, stage, metric, old, new)`` tuples."""
+    regressions = []
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for stage, measured in current['stages'].items():
+            reference = previous['stages'].get(stage)
+            if reference is None:
+                continue
+            for metric in METRICS:
+                old, new = reference.get(metric), measured.get(metric)
+                if not old or new is None:
+                    continue
+                allowance = MIN_SECONDS_DELTA if metric == 'seconds' else 0
+                if new > old * (1 + tolerance) + allowance:
+                    regressions.append((scale, stage, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark extraction and map building on synthetic IBTrACS data.')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help='storm counts to benchmark')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='stages to run')
+    parser.add_argument('--work-dir', default=WORK_DIR, help='directory for generated archives and outputs')
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSON file to write results to')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON results to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative increase over the baseline before a metric counts as a regression')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+                        help='runs of every stage; the median of each measurement is recorded')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic archives')
+    parser.add_argument('--max-map-storms', type=int, default=2000, help='storm cap for the visualize_all stage')
+    parser.add_argument('--regenerate', action='store_true', help='regenerate archives even if they exist')
+    parser.add_argument('--map-all', nargs=2, metavar=('DATA', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.map_all:
+        map_all(*args.map_all, args.max_map_storms)
+        return 0
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'max_map_storms': args.max_map_storms,
+        'scales': {},
+    }
+    for storms in args.scales:
+        print(f"{storms} storms:")
+        results['scales'][str(storms)] = run_scale(storms, args.stages, args.work_dir, args.seed,
+                                                   args.max_map_storms, args.regenerate, args.repeats)
+
+    with open(args.output, 'w') as f:
+        f.write(json.dumps(results, indent=2) + '\n')
+    print(f"Results saved to {args.output}")
+
+    if args.update_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for scale, stage, metric, old, new in regressions:
+        print(f"REGRESSION {scale} storms / {stage}: {metric} {old} -> {new} ({new / old - 1:+.0%})")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Generate synthetic IBTrACS CSV files for benchmarking.
+
+The files follow the IBTrACS v04 layout: the full 174-column header, the units
+row underneath it, a single space for every missing value and one fix every
+three hours per storm.  Tracks drift west-north-west and recurve, intensity
+rises and decays over each storm's life, and WMO fields are only reported at
+synoptic hours, so column types and missing-value patterns look like the real
+archive while the sizes are free to choose.
+
+The storms in the scripts' default ``hurricanes`` list are planted first, so
+``extract_hurricane_data.py`` and ``multi_hurricane_visualization_final.py``
+find their usual storms in any generated file.
+
+Usage::
+
+    python benchmarks/synthetic_ibtracs.py --storms 1000 --output synthetic.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from extract_hurricane_data import hurricanes  # noqa: E402
+
+# Column order of ibtracs.*.list.v04r01.csv
+COLUMNS = (
+    "SID,SEASON,NUMBER,BASIN,SUBBASIN,NAME,ISO_TIME,NATURE,LAT,LON,WMO_WIND,WMO_PRES,WMO_AGENCY,TRACK_TYPE,"
+    "DIST2LAND,LANDFALL,IFLAG,USA_AGENCY,USA_ATCF_ID,USA_LAT,USA_LON,USA_RECORD,USA_STATUS,USA_WIND,USA_PRES,"
+    "USA_SSHS,USA_R34_NE,USA_R34_SE,USA_R34_SW,USA_R34_NW,USA_R50_NE,USA_R50_SE,USA_R50_SW,USA_R50_NW,"
+    "USA_R64_NE,USA_R64_SE,USA_R64_SW,USA_R64_NW,USA_POCI,USA_ROCI,USA_RMW,USA_EYE,TOKYO_LAT,TOKYO_LON,"
+    "TOKYO_GRADE,TOKYO_WIND,TOKYO_PRES,TOKYO_R50_DIR,TOKYO_R50_LONG,TOKYO_R50_SHORT,TOKYO_R30_DIR,"
+    "TOKYO_R30_LONG,TOKYO_R30_SHORT,TOKYO_LAND,CMA_LAT,CMA_LON,CMA_CAT,CMA_WIND,CMA_PRES,HKO_LAT,HKO_LON,"
+    "HKO_CAT,HKO_WIND,HKO_PRES,KMA_LAT,KMA_LON,KMA_CAT,KMA_WIND,KMA_PRES,KMA_R50_DIR,KMA_R50_LONG,"
+    "KMA_R50_SHORT,KMA_R30_DIR,KMA_R30_LONG,KMA_R30_SHORT,NEWDELHI_LAT,NEWDELHI_LON,NEWDELHI_GRADE,"
+    "NEWDELHI_WIND,NEWDELHI_PRES,NEWDELHI_CI,NEWDELHI_DP,NEWDELHI_POCI,REUNION_LAT,REUNION_LON,REUNION_TYPE,"
+    "REUNION_WIND,REUNION_PRES,REUNION_TNUM,REUNION_CI,REUNION_RMW,REUNION_R34_NE,REUNION_R34_SE,"
+    "REUNION_R34_SW,REUNION_R34_NW,REUNION_R50_NE,REUNION_R50_SE,REUNION_R50_SW,REUNION_R50_NW,"
+    "REUNION_R64_NE,REUNION_R64_SE,REUNION_R64_SW,REUNION_R64_NW,BOM_LAT,BOM_LON,BOM_TYPE,BOM_WIND,BOM_PRES,"
+    "BOM_TNUM,BOM_CI,BOM_RMW,BOM_R34_NE,BOM_R34_SE,BOM_R34_SW,BOM_R34_NW,BOM_R50_NE,BOM_R50_SE,BOM_R50_SW,"
+    "BOM_R50_NW,BOM_R64_NE,BOM_R64_SE,BOM_R64_SW,BOM_R64_NW,BOM_ROCI,BOM_POCI,BOM_EYE,BOM_POS_METHOD,"
+    "BOM_PRES_METHOD,NADI_LAT,NADI_LON,NADI_CAT,NADI_WIND,NADI_PRES,WELLINGTON_LAT,WELLINGTON_LON,"
+    "WELLINGTON_WIND,WELLINGTON_PRES,DS824_LAT,DS824_LON,DS824_STAGE,DS824_WIND,DS824_PRES,TD9636_LAT,"
+    "TD9636_LON,TD9636_STAGE,TD9636_WIND,TD9636_PRES,TD9635_LAT,TD9635_LON,TD9635_WIND,TD9635_PRES,"
+    "TD9635_ROCI,NEUMANN_LAT,NEUMANN_LON,NEUMANN_CLASS,NEUMANN_WIND,NEUMANN_PRES,MLC_LAT,MLC_LON,MLC_CLASS,"
+    "MLC_WIND,MLC_PRES,USA_GUST,BOM_GUST,BOM_GUST_PER,REUNION_GUST,REUNION_GUST_PER,USA_SEAHGT,USA_SEARAD_NE,"
+    "USA_SEARAD_SE,USA_SEARAD_SW,USA_SEARAD_NW,STORM_SPEED,STORM_DIR"
+).split(',')
+
+MISSING = ' '
+
+# Storm names for the generated storms; kept apart from the planted ones so lookups stay unambiguous
+NAMES = ['ALLISON', 'BARRY', 'CHANTAL', 'DEAN', 'ERIN', 'FELIX', 'GABRIELLE', 'HUMBERTO', 'INGRID',
+         'JERRY', 'KAREN', 'LORENZO', 'MELISSA', 'NESTOR', 'OLGA', 'PABLO', 'REBEKAH', 'SEBASTIEN',
+         'TANYA', 'VAN', 'WENDY']
+
+FIRST_SEASON = 1980
+LAST_SEASON = 2024
+
+# Fixes per storm, at 3-hour spacing (1 to 15 days)
+MIN_FIXES = 8
+MAX_FIXES = 120
+
+# Storms per CSV write; bounds the generator's memory at any archive size
+CHUNK_STORMS = 2000
+
+
+def _units_row():
+    """The units row IBTrACS writes under its header."""
+    units = []
+    for column in COLUMNS:
+        if column == 'SEASON':
+            units.append('Year')
+        elif column.endswith('_LAT') or column == 'LAT':
+            units.append('degrees_north')
+        elif column.endswith('_LON') or column == 'LON':
+            units.append('degrees_east')
+        elif column.endswith(('_WIND', '_GUST')) or column == 'STORM_SPEED':
+            units.append('kts')
+        elif column.endswith(('_PRES', '_POCI')):
+            units.append('mb')
+        elif column in ('DIST2LAND', 'LANDFALL'):
+            units.append('km')
+        elif column == 'STORM_DIR':
+            units.append('degrees')
+        else:
+            units.append(MISSING)
+    return units
+
+
+def _sshs(wind):
+    """Saffir-Simpson category from wind speed in knots (-1 below tropical storm strength)."""
+    return np.digitize(wind, [34, 64, 83, 96, 113, 137]) - 1
+
+
+def _text(values, missing=None, fmt=None):
+    """Column of CSV text; ``missing`` marks the positions written as a blank space."""
+    if fmt is not None:
+        text = np.char.mod(fmt, values).astype(object)
+    else:
+        text = np.asarray(values).astype(str).astype(object)
+    if missing is not None:
+        text[missing] = MISSING
+    return text
+
+
+def _storms(rng, storm_ids, seasons, numbers, names):
+    """Rows for one chunk of storms as ``{column: text array}`` (absent columns are all missing)."""
+    n = len(storm_ids)
+    fixes = rng.integers(MIN_FIXES, MAX_FIXES + 1, n)
+    storm = np.repeat(np.arange(n), fixes)
+    start = np.repeat(np.cumsum(fixes) - fixes, fixes)
+    step = np.arange(len(storm)) - start
+    life = step / np.repeat(fixes - 1, fixes)
+
+    # Track: west-north-west drift that recurves to the north-east late in life
+    lat0 = rng.uniform(9, 25, n)[storm]
+    lon0 = rng.uniform(-80, -20, n)[storm]
+    speed = rng.uniform(0.25, 0.6, n)[storm]
+    recurve = rng.uniform(0.4, 0.9, n)[storm]
+    dlon = np.where(life < recurve, -speed, speed * 1.5) + rng.normal(0, 0.05, len(storm))
+    dlat = np.where(life < recurve, speed * 0.35, speed) + rng.normal(0, 0.05, len(storm))
+    dlon[step == 0] = 0
+    dlat[step == 0] = 0
+    # Per-storm cumulative sums: the running total minus its value at each storm's first fix
+    first = np.flatnonzero(step == 0)
+    lat = lat0 + np.cumsum(dlat) - np.repeat(np.cumsum(dlat)[first], fixes)
+    lon = lon0 + np.cumsum(dlon) - np.repeat(np.cumsum(dlon)[first], fixes)
+    lat = np.clip(lat, -60, 65)
+
+    # Intensity: a rise-and-decay curve with noise, in 5 kt steps like the best-track data
+    peak = rng.gamma(2.0, 30.0, n)[storm] + 30
+    wind = 25 + (peak - 25) * np.sin(np.pi * life) ** 1.5 + rng.normal(0, 3, len(storm))
+    wind = np.clip(np.round(wind / 5) * 5, 15, 185).astype(int)
+    pres = np.clip(1012 - 0.9 * (wind - 25) + rng.normal(0, 2, len(storm)), 880, 1020).astype(int)
+    sshs = _sshs(wind)
+
+    # Distance to land: the coast runs along 80W, so westbound storms make landfall
+    dist2land = np.clip((lon + 80) * 95 + rng.normal(0, 30, len(storm)), 0, 3000).astype(int)
+
+    base = pd.Timestamp(f"{FIRST_SEASON}-01-01")
+    start_time = (pd.to_datetime(seasons.astype(str), format='%Y')
+                  + pd.to_timedelta(rng.integers(150, 320, n), unit='D')
+                  + pd.to_timedelta(rng.integers(0, 4, n) * 6, unit='h'))
+    offsets = (start_time - base).to_numpy().astype('timedelta64[h]').astype(np.int64)
+    times = base + pd.to_timedelta(offsets[storm] + 3 * step, unit='h')
+    hour = times.hour.to_numpy()
+
+    synoptic = hour % 6 == 0
+    status = np.select([wind < 34, wind < 64], ['TD', 'TS'], 'HU')
+    status = np.where((life > 0.9) & (lat > 35), 'EX', status)
+    nature = np.where(status == 'EX', 'ET', np.where(life < 0.05, 'DS', 'TS'))
+    usa_missing = rng.random(len(storm)) < 0.02
+    pres_missing = usa_missing | (rng.random(len(storm)) < 0.05)
+    below_34 = wind < 34
+    landfall = np.where(dist2land == 0, 0, dist2land)
+    heading = (np.degrees(np.arctan2(dlon, dlat)) % 360).astype(int)
+    forward = np.hypot(dlon, dlat) * 60 / 3
+
+    season_text = seasons.astype(str)
+    rows = {
+        'SID': _text(np.asarray(storm_ids, dtype=object)[storm]),
+        'SEASON': _text(season_text[storm]),
+        'NUMBER': _text(numbers[storm]),
+        'BASIN': _text(np.full(len(storm), 'NA')),
+        'SUBBASIN': _text(np.full(len(storm), 'MM')),
+        'NAME': _text(np.asarray(names, dtype=object)[storm]),
+        'ISO_TIME': _text(times.strftime('%Y-%m-%d %H:%M:%S').to_numpy()),
+        'NATURE': _text(nature),
+        'LAT': _text(lat, fmt='%.1f'),
+        'LON': _text(lon, fmt='%.1f'),
+        'WMO_WIND': _text(wind, missing=~synoptic),
+        'WMO_PRES': _text(pres, missing=~synoptic),
+        'WMO_AGENCY': _text(np.full(len(storm), 'hurdat_atl'), missing=~synoptic),
+        'TRACK_TYPE': _text(np.full(len(storm), 'main')),
+        'DIST2LAND': _text(dist2land),
+        'LANDFALL': _text(landfall),
+        'IFLAG': _text(np.where(synoptic, 'O______________', 'P______________')),
+        'USA_AGENCY': _text(np.full(len(storm), 'hurdat_atl'), missing=~synoptic),
+        'USA_ATCF_ID': _text(np.char.add('AL', np.char.zfill(((np.arange(n) % 40) + 1).astype(str), 2))[storm]),
+        'USA_LAT': _text(lat, fmt='%.1f'),
+        'USA_LON': _text(lon, fmt='%.1f'),
+        'USA_RECORD': _text(np.full(len(storm), 'L'), missing=dist2land != 0),
+        'USA_STATUS': _text(status),
+        'USA_WIND': _text(wind, missing=usa_missing),
+        'USA_PRES': _text(pres, missing=pres_missing),
+        'USA_SSHS': _text(sshs, missing=usa_missing),
+        'USA_POCI': _text(np.full(len(storm), 1012), missing=pres_missing),
+        'USA_ROCI': _text(rng.integers(100, 300, len(storm)), missing=pres_missing),
+        'USA_RMW': _text(rng.integers(10, 60, len(storm)), missing=pres_missing),
+        'STORM_SPEED': _text(np.round(forward).astype(int)),
+        'STORM_DIR': _text(heading),
+    }
+    for quadrant in ('NE', 'SE', 'SW', 'NW'):
+        rows[f'USA_R34_{quadrant}'] = _text(rng.integers(20, 200, len(storm)), missing=below_34 | usa_missing)
+    return rows
+
+
+def _planted():
+    """SIDs, seasons and names of the scripts' default storms."""
+    seasons = np.array([int(h['year']) for h in hurricanes])
+    names = [h['name'] for h in hurricanes]
+    sids = [f"{season}{200 + i:03d}N{10 + i:02d}{300 + i:03d}" for i, season in enumerate(seasons)]
+    return sids, seasons, names
+
+
+def generate(path, storms, seed=0):
+    """Write a synthetic IBTrACS CSV with ``storms`` storms to ``path``; returns the number of rows."""
+    rng = np.random.default_rng(seed)
+    planted_sids, planted_seasons, planted_names = _planted()
+    planted = min(storms, len(planted_sids))
+
+    seasons = rng.integers(FIRST_SEASON, LAST_SEASON + 1, storms)
+    seasons[:planted] = planted_seasons[:planted]
+    # Storm numbers within each season make the SIDs unique
+    numbers = pd.Series(seasons).groupby(seasons).cumcount().to_numpy() + 1
+    sids = [f"{season}{number:03d}N{lat:02d}{lon:03d}" for season, number, lat, lon in
+            zip(seasons, numbers, rng.integers(8, 30, storms), rng.integers(280, 345, storms))]
+    sids[:planted] = planted_sids[:planted]
+    names = np.where(rng.random(storms) < 0.3, 'NOT_NAMED', np.asarray(NAMES)[rng.integers(0, len(NAMES), storms)])
+    names = names.astype(object)
+    names[:planted] = planted_names[:planted]
+
+    total = 0
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        f.write(','.join(_units_row()) + '\n')
+        for first in range(0, storms, CHUNK_STORMS):
+            chunk = slice(first, min(first + CHUNK_STORMS, storms))
+            rows = _storms(rng, sids[chunk], seasons[chunk], numbers[chunk], names[chunk])
+            # Runs of all-missing columns are joined as one constant string
+            line = rows['SID']
+            gap = ''
+            for column in COLUMNS[1:]:
+                if column in rows:
+                    line = line + (gap + ',') + rows[column]
+                    gap = ''
+                else:
+                    gap += ',' + MISSING
+            f.write('\n'.join(line + gap) + '\n')
+            total += len(line)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic IBTrACS-format CSV for benchmarking.')
+    parser.add_argument('--storms', type=int, default=1000, help='number of storms to generate')
+    parser.add_argument('--output', default='synthetic_ibtracs.csv', help='CSV file to write')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args(argv)
+
+    rows = generate(args.output, args.storms, args.seed)
+    print(f"Wrote {args.storms} storms ({rows} rows) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Offline, pre-simplified boundary layers for the hurricane maps.
+
+Boundary geometry ships with the repository under ``boundaries/`` (see its
+``manifest.json`` for the source and version of each layer), so building a map
+never fetches anything from a third-party host.  Each layer is simplified with
+Douglas-Peucker into a few zoom bands, each accurate to about a pixel across
+its band.  Rather than storing every band separately, each vertex is stored
+once with the index of the first band that keeps it, and the result is cached
+on disk keyed by the layer file's hash.  The page draws only the vertices of
+the band that matches the current zoom, either from that compact form
+embedded in the page or from per-band files written next to it.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from branca.element import Element, MacroElement
+from jinja2 import Template
+
+from geometry import douglas_peucker_importance, mercator, pixel_size
+from ibtracs_cache import CACHE_DIR
+
+BOUNDARY_DIR = Path(__file__).resolve().parent / 'boundaries'
+MANIFEST_FILE = 'manifest.json'
+
+# Bump when the simplification changes so cached bands are rebuilt
+BOUNDARY_CACHE_VERSION = 1
+
+# First zoom level of each band; a band is simplified for the deepest zoom it covers
+LEVEL_MIN_ZOOMS = [0, 4, 6, 8]
+# Zoom the last, open-ended band is simplified for
+FINEST_ZOOM = 10
+
+# Coordinate decimals stored (~10 m)
+COORD_DECIMALS = 4
+
+DEFAULT_LAYERS = ['us-states']
+
+BOUNDARY_STYLE = {
+    'fillColor': 'transparent',
+    'color': 'gray',
+    'weight': 1
+}
+
+
+def available_layers():
+    """The manifest of bundled boundary layers: ``{name: {file, version, source, description}}``."""
+    with open(BOUNDARY_DIR / MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def _level_tolerance(level):
+    """Tolerance of band ``level``: one pixel at the deepest zoom the band is shown at."""
+    if level + 1 < len(LEVEL_MIN_ZOOMS):
+        return pixel_size(LEVEL_MIN_ZOOMS[level + 1] - 1)
+    return pixel_size(FINEST_ZOOM)
+
+
+def _banded_line(coords):
+    """``[[lon, lat, band], ...]`` for the vertices of one ring or line that survive the finest band."""
+    coords = np.asarray(coords, dtype=float)
+    x, y = mercator(coords[:, 0], coords[:, 1])
+    importance = douglas_peucker_importance(x, y)
+    tolerances = np.array([_level_tolerance(level) for level in range(len(LEVEL_MIN_ZOOMS))])
+    # Tolerances shrink band by band, so this counts the bands that drop the vertex
+    band = (importance[:, None] <= tolerances[None, :]).sum(axis=1)
+    kept = band < len(LEVEL_MIN_ZOOMS)
+    return np.column_stack([coords[kept].round(COORD_DECIMALS), band[kept]]).tolist()
+
+
+def banded_collection(collection):
+    """Compact form of a FeatureCollection with every vertex tagged by the first band that keeps it."""
+    features = []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        kind = geometry['type']
+        if kind == 'LineString':
+            coords = _banded_line(geometry['coordinates'])
+        elif kind in ('MultiLineString', 'Polygon'):
+            coords = [_banded_line(line) for line in geometry['coordinates']]
+        elif kind == 'MultiPolygon':
+            coords = [[_banded_line(ring) for ring in polygon] for polygon in geometry['coordinates']]
+        else:
+            continue
+        features.append({'type': 'Feature', 'properties': feature.get('properties', {}),
+                         'geometry': {'type': kind, 'coordinates': coords}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _band_line(coords, level, closed):
+    line = [[lon, lat] for lon, lat, band in coords if band <= level]
+    # Rounding can collapse neighbours onto the same point
+    line = [point for i, point in enumerate(line) if i == 0 or point != line[i - 1]]
+    return line if len(line) >= (4 if closed else 2) else None
+
+
+def band_collection(banded, level):
+    """Plain GeoJSON for one band of a :func:`banded_collection` (mirrors the page-side filter)."""
+    features = []
+    for feature in banded['features']:
+        kind = feature['geometry']['type']
+        coords = feature['geometry']['coordinates']
+        if kind == 'LineString':
+            coords = _band_line(coords, level, closed=False)
+        elif kind == 'MultiLineString':
+            coords = [line for line in (_band_line(c, level, closed=False) for c in coords) if line] or None
+        else:
+            polygons = [coords] if kind == 'Polygon' else coords
+            kept = []
+            for rings in polygons:
+                outer = _band_line(rings[0], level, closed=True)
+                # An outer ring that vanishes takes its holes with it
+                if outer is not None:
+                    kept.append([outer] + [hole for hole in (_band_line(r, level, closed=True) for r in rings[1:]) if hole])
+            coords = (kept[0] if kind == 'Polygon' else kept) if kept else None
+        if coords is not None:
+            features.append({'type': 'Feature', 'properties': feature['properties'],
+                             'geometry': {'type': kind, 'coordinates': coords}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def banded_layer(name, cache_dir=CACHE_DIR):
+    """The :func:`banded_collection` of boundary layer ``name``, from the on-disk cache when possible."""
+    path = BOUNDARY_DIR / available_layers()[name]['file']
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()[:16]
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / 'boundaries' / f"{name}-{digest}-v{BOUNDARY_CACHE_VERSION}.json"
+        if cache_file.exists():
+            with open(cache_file) as f:
+                return json.load(f)
+
+    banded = banded_collection(json.loads(content))
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(banded, separators=(',', ':')))
+        os.replace(tmp, cache_file)
+    return banded
+
+
+def write_band_files(name, banded, directory):
+    """Write each band of ``name`` to ``directory`` as plain GeoJSON; returns the page's level list."""
+    os.makedirs(directory, exist_ok=True)
+    levels = []
+    for level, min_zoom in enumerate(LEVEL_MIN_ZOOMS):
+        filename = f"{name}-z{min_zoom}.json"
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write(json.dumps(band_collection(banded, level), separators=(',', ':')))
+        levels.append({'min_zoom': min_zoom, 'url': f"{os.path.basename(os.path.normpath(directory))}/{filename}"})
+    return levels
+
+
+class BoundaryLayer(MacroElement):
+    """A boundary layer that draws the simplification band matching the map's zoom.
+
+    ``source`` is either the embedded :func:`banded_collection` (``{'banded': ...}``)
+    or the per-band file list from :func:`write_band_files` (``{'levels': ...}``).
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = hurricaneBoundaryLayer(
+            {{ this._parent.get_name() }}, {{ this.min_zooms|tojson }}, {{ this.source|tojson }}, {{ this.style|tojson }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, source, style=None):
+        super().__init__()
+        self._name = 'BoundaryLayer'
+        self.min_zooms = LEVEL_MIN_ZOOMS
+        self.source = source
+        self.style = style or BOUNDARY_STYLE
+
+
+# Page-side band switcher, added to the page header once
+BOUNDARY_LAYER_JS = """
+<script>
+function hurricaneBoundaryBand(banded, level) {
+    function line(coords, closed) {
+        var kept = [];
+        coords.forEach(function(c) {
+            var last = kept[kept.length - 1];
+            if (c[2] <= level && !(last && last[0] === c[0] && last[1] === c[1])) { kept.push([c[0], c[1]]); }
+        });
+        return kept.length >= (closed ? 4 : 2) ? kept : null;
+    }
+    function polygon(rings) {
+        var outer = line(rings[0], true);
+        if (!outer) { return null; }
+        return [outer].concat(rings.slice(1).map(function(r) { return line(r, true); }).filter(Boolean));
+    }
+    var features = [];
+    banded.features.forEach(function(feature) {
+        var g = feature.geometry, coords;
+        if (g.type === 'LineString') { coords = line(g.coordinates, false); }
+        else if (g.type === 'MultiLineString') { coords = g.coordinates.map(function(c) { return line(c, false); }).filter(Boolean); }
+        else if (g.type === 'Polygon') { coords = polygon(g.coordinates); }
+        else { coords = g.coordinates.map(polygon).filter(Boolean); }
+        if (coords && coords.length) {
+            features.push({type: 'Feature', properties: feature.properties, geometry: {type: g.type, coordinates: coords}});
+        }
+    });
+    return {type: 'FeatureCollection', features: features};
+}
+
+function hurricaneBoundaryLayer(map, minZooms, source, style) {
+    var layer = L.geoJSON(null, {style: style, interactive: false}).addTo(map);
+    var current = null, bands = {};
+    function show(level, data) {
+        if (current !== level) { return; }
+        layer.clearLayers();
+        layer.addData(data);
+    }
+    function update() {
+        var zoom = map.getZoom(), level = 0;
+        minZooms.forEach(function(minZoom, i) { if (zoom >= minZoom) { level = i; } });
+        if (level === current) { return; }
+        current = level;
+        if (bands[level]) {
+            show(level, bands[level]);
+        } else if (source.banded) {
+            show(level, bands[level] = hurricaneBoundaryBand(source.banded, level));
+        } else {
+            fetch(source.levels[level].url).then(function(response) { return response.json(); }).then(function(data) {
+                show(level, bands[level] = data);
+            });
+        }
+    }
+    map.on('zoomend', update);
+    update();
+    return layer;
+}
+</script>
+"""
+
+
+def add_boundaries(hurricane_map, names=DEFAULT_LAYERS, files_dir=None, cache_dir=CACHE_DIR):
+    """Add the named boundary layers to ``hurricane_map``.
+
+    By default the banded geometry is embedded in the page.  With ``files_dir`` the bands
+    are written there instead and the page fetches only the band it needs; the
+    directory must sit next to the saved page.
+    """
+    hurricane_map.get_root().header.add_child(Element(BOUNDARY_LAYER_JS))
+    for name in names:
+        banded = banded_layer(name, cache_dir)
+        if files_dir is None:
+            source = {'banded': banded}
+        else:
+            source = {'levels': write_band_files(name, banded, files_dir)}
+        BoundaryLayer(source).add_to(hurricane_map)
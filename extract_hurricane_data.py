@@ -1,5 +1,22 @@
+import argparse
+
 import pandas as pd
 
+import profiling
+from ibtracs_cache import CACHE_DIR, load_ibtracs
+from storm_index import StormIndex
+
+# Default IBTrACS source file and extracted output file
+SOURCE_FILE = 'ibtracs.NA.list.v04r01.csv'
+OUTPUT_FILE = 'hurricane_data_extracted.csv'
+
+# Columns the visualization script and its storm metrics read; the streaming extractor keeps only these
+VISUALIZER_COLUMNS = ['SID', 'SEASON', 'NAME', 'ISO_TIME', 'NATURE', 'LAT', 'LON', 'DIST2LAND',
+                      'USA_WIND', 'USA_PRES', 'USA_SSHS']
+
+# Rows per chunk when streaming the source file
+DEFAULT_CHUNKSIZE = 50000
+
 # List of hurricanes we want to extract
 hurricanes = [
     {'name': 'IRENE', 'year': 2011},
@@ -11,34 +28,149 @@ hurricanes = [
     {'name': 'HELENE', 'year': 2024}
 ]
 
-# Load the original large CSV file
-print("Loading original CSV file...")
-df = pd.read_csv('ibtracs.NA.list.v04r01.csv', skiprows=[1], low_memory=False)
-
-# Create an empty DataFrame to store the extracted data
-extracted_data = pd.DataFrame()
-
-# Extract data for each hurricane
-print("Extracting hurricane data...")
-for hurricane in hurricanes:
-    name = hurricane['name']
-    year = hurricane['year']
-    
-    # Filter for the specific hurricane and year
-    hurricane_data = df[(df['NAME'].str.upper() == name) & (df['SEASON'] == year)]
-    
-    if not hurricane_data.empty:
-        print(f"Found {len(hurricane_data)} data points for {name} ({year})")
-        extracted_data = pd.concat([extracted_data, hurricane_data])
+
+def _storm_key(name, year):
+    """Build the NAME|SEASON lookup key used to match rows against the requested storms."""
+    return f"{str(name).strip().upper()}|{str(year).strip()}"
+
+
+def _print_summary(found, hurricanes, extracted_rows, total_rows, output_file):
+    for hurricane in hurricanes:
+        count = found.get(_storm_key(hurricane['name'], hurricane['year']), 0)
+        if count:
+            print(f"Found {count} data points for {hurricane['name']} ({hurricane['year']})")
+        else:
+            print(f"No data found for {hurricane['name']} ({hurricane['year']})")
+
+    print(f"Extraction complete! Saved {extracted_rows} data points for {len(hurricanes)} hurricanes to {output_file}.")
+    print(f"Original file size: {total_rows} rows")
+    print(f"New file size: {extracted_rows} rows")
+    if total_rows:
+        print(f"Reduction: {(1 - extracted_rows/total_rows)*100:.2f}%")
+
+
+def extract_full(source, output_file, hurricanes, cache_dir=CACHE_DIR):
+    """Load the whole source file into memory and extract every column for the requested storms.
+
+    The source is read through the column cache, so only the first run parses the CSV text,
+    and storms are located through the archive's storm index instead of a scan per storm.
+    """
+    # Load the original large CSV file
+    print("Loading original CSV file...")
+    with profiling.stage('load', source=source) as counters:
+        df = load_ibtracs(source, cache_dir=cache_dir)
+        counters['rows'] = len(df)
+    with profiling.stage('storm_index'):
+        if cache_dir is None:
+            index = StormIndex.build(df)
+        else:
+            index = StormIndex.for_archive(source, cache_dir)
+
+    # Create an empty DataFrame to store the extracted data
+    extracted_data = pd.DataFrame()
+
+    # Extract data for each hurricane
+    print("Extracting hurricane data...")
+    found = {}
+    for hurricane in hurricanes:
+        name = hurricane['name']
+        year = hurricane['year']
+
+        with profiling.stage('storm', name=name, year=year) as counters:
+            # Every storm with this name and year, in archive order
+            sids = index.lookup(name, year)
+            hurricane_data = pd.concat([index.track(df, sid) for sid in sids]) if sids else df.iloc[:0]
+
+            if not hurricane_data.empty:
+                found[_storm_key(name, year)] = len(hurricane_data)
+                extracted_data = pd.concat([extracted_data, hurricane_data])
+            counters['rows'] = len(hurricane_data)
+
+    # Save the extracted data to a new CSV file
+    print(f"Saving extracted data to {output_file}...")
+    with profiling.stage('write', rows=len(extracted_data)):
+        extracted_data.to_csv(output_file, index=False)
+
+    _print_summary(found, hurricanes, len(extracted_data), len(df), output_file)
+
+
+def extract_streaming(source, output_file, hurricanes, columns=VISUALIZER_COLUMNS,
+                      chunksize=DEFAULT_CHUNKSIZE):
+    """Extract the requested storms in a single chunked pass over the source file.
+
+    Only ``columns`` are parsed, every chunk is matched against all requested
+    (name, season) keys with one hash lookup, and matching rows are appended to
+    ``output_file`` straight away, so memory use depends on ``chunksize`` rather
+    than on the size of the archive or the number of storms requested.
+    """
+    wanted = {_storm_key(h['name'], h['year']) for h in hurricanes}
+    found = {}
+    total_rows = 0
+    extracted_rows = 0
+
+    # Keep every value as the original text so matched rows are written back unchanged
+    print(f"Streaming {source} in chunks of {chunksize} rows...")
+    reader = pd.read_csv(source, skiprows=[1], usecols=columns, dtype=str,
+                         keep_default_na=False, chunksize=chunksize)
+
+    with open(output_file, 'w', newline='') as out:
+        header = True
+        chunks = iter(reader)
+        while True:
+            # Each chunk's stage covers parsing it as well as matching and writing
+            with profiling.stage('chunk') as counters:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                total_rows += len(chunk)
+                counters['rows'] = len(chunk)
+
+                keys = chunk['NAME'].str.strip().str.upper() + '|' + chunk['SEASON'].str.strip()
+                mask = keys.isin(wanted)
+                counters['matches'] = int(mask.sum())
+                if not mask.any():
+                    continue
+
+                matches = chunk[mask]
+                matches.to_csv(out, header=header, index=False)
+                header = False
+                extracted_rows += len(matches)
+
+                for key, count in keys[mask].value_counts().items():
+                    found[key] = found.get(key, 0) + int(count)
+
+        # Still write a header when nothing matched so the output is a valid CSV
+        if header:
+            pd.DataFrame(columns=columns).to_csv(out, index=False)
+
+    _print_summary(found, hurricanes, extracted_rows, total_rows, output_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract selected hurricanes from an IBTrACS CSV file.')
+    parser.add_argument('--source', default=SOURCE_FILE, help='IBTrACS CSV file to read')
+    parser.add_argument('--output', default=OUTPUT_FILE, help='CSV file to write the extracted rows to')
+    parser.add_argument('--stream', action='store_true',
+                        help='read the source in chunks, keeping only the columns the visualization needs')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help='rows per chunk in streaming mode')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='directory for the parsed column cache')
+    parser.add_argument('--no-cache', action='store_true', help='parse the source CSV without using the cache')
+    parser.add_argument('--profile', nargs='?', const=profiling.DEFAULT_TRACE_FILE, metavar='TRACE_FILE',
+                        help='record per-stage time and memory to a Chrome trace file '
+                             f'(default {profiling.DEFAULT_TRACE_FILE}; also enabled by ${profiling.PROFILE_ENV})')
+    args = parser.parse_args(argv)
+
+    profiling.configure(args.profile)
+    if args.stream:
+        with profiling.stage('extract_streaming'):
+            extract_streaming(args.source, args.output, hurricanes, chunksize=args.chunksize)
     else:
-        print(f"No data found for {name} ({year})")
+        with profiling.stage('extract_full'):
+            extract_full(args.source, args.output, hurricanes,
+                         cache_dir=None if args.no_cache else args.cache_dir)
+    profiling.save()
 
-# Save the extracted data to a new CSV file
-output_file = 'hurricane_data_extracted.csv'
-print(f"Saving extracted data to {output_file}...")
-extracted_data.to_csv(output_file, index=False)
 
-print(f"Extraction complete! Saved {len(extracted_data)} data points for {len(hurricanes)} hurricanes.")
-print(f"Original file size: {len(df)} rows")
-print(f"New file size: {len(extracted_data)} rows")
-print(f"Reduction: {(1 - len(extracted_data)/len(df))*100:.2f}%")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""On-disk cache of rendered per-storm map fragments for incremental builds.
+
+Each storm's fragment (its serialized layer payload, summary panel entry and
+bounds) is stored under a hash of everything it is built from: the storm's
+input rows, its entry in the storm list and the code that renders it.  A
+rebuild after an IBTrACS update therefore re-renders only the storms whose
+rows changed, and the page is assembled by concatenating cached fragments.
+Fragments of storms that are no longer selected are evicted after each build.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from ibtracs_cache import CACHE_DIR, cache_location
+
+# Bump when the fragment layout changes so old fragments are rebuilt
+FRAGMENT_VERSION = 1
+
+FRAGMENT_SUFFIX = '.json'
+
+
+def code_digest(paths):
+    """Hash of the source files that render fragments, so editing them invalidates the cache."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def storm_digest(track, entry, salt=''):
+    """Content hash of one storm's input rows and its storm list ``entry``.
+
+    ``track`` is the storm's rows as loaded from the archive; values are hashed
+    (not categorical codes or row positions), so the hash is stable across
+    cache rebuilds and only changes when the storm's data does.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{FRAGMENT_VERSION}|{salt}|".encode())
+    digest.update(json.dumps(entry, sort_keys=True).encode())
+    digest.update(json.dumps(list(track.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(track, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class FragmentCache:
+    """A directory of fragments named by their content hash."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_output(cls, output_file, cache_dir=CACHE_DIR):
+        """The fragment cache of the page written to ``output_file``."""
+        return cls(cache_location(output_file, Path(cache_dir) / 'fragments'))
+
+    def _path(self, digest):
+        return self.directory / f"{digest}{FRAGMENT_SUFFIX}"
+
+    def get(self, digest):
+        """The cached fragment for ``digest``, or None."""
+        try:
+            with open(self._path(digest)) as f:
+                fragment = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return fragment
+
+    def put(self, digest, fragment):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(digest)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            f.write(json.dumps(fragment, separators=(',', ':')))
+        os.replace(tmp, path)
+
+    def retain(self, digests):
+        """Delete every fragment not in ``digests``; returns the number evicted."""
+        if not self.directory.exists():
+            return 0
+        keep = {f"{digest}{FRAGMENT_SUFFIX}" for digest in digests}
+        evicted = 0
+        for path in self.directory.iterdir():
+            if path.name not in keep:
+                path.unlink()
+                evicted += 1
+        return evicted
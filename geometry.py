@@ -0,0 +1,109 @@
+"""Vectorized geometry helpers shared by the track and boundary layer builders and the spatial index."""
+import numpy as np
+
+# Web Mercator cannot represent the poles; Leaflet clips latitudes to this range
+MAX_MERCATOR_LAT = 85.0511287798
+
+# Mean Earth radius (IUGG), used for great-circle distances
+EARTH_RADIUS_KM = 6371.0088
+
+
+def mercator(lon, lat):
+    """Project lon/lat degrees to Web Mercator world coordinates in ``[0, 1]`` (y grows southwards)."""
+    lon = np.asarray(lon, dtype=float)
+    lat = np.clip(np.asarray(lat, dtype=float), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    x = (lon + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / np.pi) / 2.0
+    return x, y
+
+
+def inverse_mercator(x, y):
+    """Inverse of :func:`mercator`: Web Mercator world coordinates back to lon/lat degrees."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return x * 360.0 - 180.0, np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * y))))
+
+
+def wrap_longitude(lon):
+    """Wrap longitudes (or longitude differences) into ``[-180, 180)``."""
+    return (np.asarray(lon, dtype=float) + 180.0) % 360.0 - 180.0
+
+
+def haversine_km(lon0, lat0, lon1, lat1):
+    """Great-circle distance in km between lon/lat points, element-wise over arrays."""
+    lon0, lat0, lon1, lat1 = (np.radians(np.asarray(v, dtype=float)) for v in (lon0, lat0, lon1, lat1))
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def clip_segments(x0, y0, x1, y1, xmin, ymin, xmax, ymax):
+    """Liang-Barsky clipping of segments against boxes, element-wise.
+
+    Returns ``(enter, leave, hit)``: the part of segment ``i`` inside box ``i``
+    runs from parameter ``enter[i]`` to ``leave[i]`` (0 at the first endpoint,
+    1 at the second), and ``hit[i]`` says whether the segment touches the box.
+    """
+    x0, y0, x1, y1 = (np.asarray(v, dtype=float) for v in (x0, y0, x1, y1))
+    dx = x1 - x0
+    dy = y1 - y0
+    enter = np.zeros(x0.shape)
+    leave = np.ones(x0.shape)
+    hit = np.ones(x0.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+            hit &= (p != 0) | (q >= 0)
+            ratio = q / p
+            enter = np.where(p < 0, np.maximum(enter, ratio), enter)
+            leave = np.where(p > 0, np.minimum(leave, ratio), leave)
+    return enter, leave, hit & (enter <= leave)
+
+
+def pixel_size(zoom, tile_size=256):
+    """Size of one screen pixel at ``zoom``, in Web Mercator world coordinates."""
+    return 1.0 / (tile_size * 2 ** zoom)
+
+
+def douglas_peucker_importance(x, y):
+    """Per-vertex Douglas-Peucker tolerance thresholds for a polyline.
+
+    Vertex ``i`` survives simplification at tolerance ``t`` exactly when
+    ``importance[i] > t``; endpoints are ``inf``.  Computing this once lets
+    every level of detail be taken with a single comparison instead of
+    re-running the simplification per tolerance.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+
+    # (first, last, ceiling): a vertex can never outlive the split that exposed it
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, ceiling = stack.pop()
+        if last - first < 2:
+            continue
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        length2 = dx * dx + dy * dy
+        if length2 == 0:
+            distance = np.hypot(px, py)
+        else:
+            # Distance to the segment, not the infinite line, so spikes past an endpoint are kept
+            t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+            distance = np.hypot(px - t * dx, py - t * dy)
+        split = first + 1 + int(np.argmax(distance))
+        value = min(float(distance[split - first - 1]), ceiling)
+        importance[split] = value
+        stack.append((first, split, value))
+        stack.append((split, last, value))
+    return importance
+
+
+def douglas_peucker(x, y, tolerance):
+    """Boolean mask of the vertices kept by Douglas-Peucker simplification at ``tolerance``."""
+    return douglas_peucker_importance(x, y) > tolerance
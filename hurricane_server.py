@@ -0,0 +1,251 @@
+"""Local HTTP server that renders hurricane maps on demand.
+
+The archive (column cache and storm index) is loaded once at startup and kept
+in memory.  Built storms and complete pages are kept in one LRU cache bounded
+by their size in bytes, so a repeated map is served straight from memory and a
+new combination of already built storms only pays for assembling the page.
+
+Usage::
+
+    python hurricane_server.py --data hurricane_data_extracted.csv --port 8000
+
+then open ``http://localhost:8000/map?storms=IRENE|2011,IAN|2022``.  Storms may
+be given as ``NAME|YEAR``, ``NAME YEAR`` or storm IDs, comma-separated or as
+repeated ``storms`` parameters; ``/`` serves the default storm list and
+``/stats`` reports the cache state as JSON.
+
+Storms can also be selected geographically through the spatial index (see
+:mod:`spatial_index`), with ``bbox=MIN_LON,MIN_LAT,MAX_LON,MAX_LAT``,
+``near=LAT,LON,KM`` and/or ``region=NAME``, optionally limited by ``since`` and
+``until`` seasons, e.g. ``/map?near=27.95,-82.46,100&since=1950``.
+
+``analogs=STORM`` adds a storm and its closest historical tracks (see
+:mod:`analogs`) to the map, ``analog_count`` of them (default 5), also
+limited by ``since`` and ``until``, e.g. ``/map?analogs=MILTON|2024&analog_count=10``.
+``animate=1`` adds time-animated playback of the storms (see :mod:`animation`).
+"""
+import argparse
+import json
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from analogs import DEFAULT_ANALOG_COUNT, AnalogIndex, analog_entries
+from extract_hurricane_data import OUTPUT_FILE
+from multi_hurricane_visualization_final import build_map, find_storm, hurricanes, load_archive, with_analogs
+from spatial_index import SpatialIndex, select_storms
+from storm_index import storm_entry
+
+# Default cache budget for built storms and pages
+DEFAULT_CACHE_MB = 256
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by the total size of its values.
+
+    Sizes are given by the caller on :meth:`put`; a value larger than the whole
+    budget is not stored.  Safe to share between the server's request threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, size = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._items),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class MapService:
+    """The loaded archive plus the cache of built storms and pages."""
+
+    def __init__(self, data_file=OUTPUT_FILE, cache_bytes=DEFAULT_CACHE_MB << 20):
+        self.data_file = data_file
+        self.archive = load_archive(data_file)
+        self.spatial_index = SpatialIndex.for_archive(data_file)
+        self.analog_index = AnalogIndex.for_archive(data_file)
+        self.cache = LRUCache(cache_bytes)
+
+    def find_storm(self, entry):
+        """The storm ID of ``entry``, resolved as the visualization does.
+
+        A key that matches no storm or several raises ValueError, which the handler
+        answers with a 400 naming the key or listing the candidate storm IDs.
+        """
+        try:
+            return find_storm(self.archive[1], entry)
+        except LookupError as e:
+            raise ValueError(e.args[0]) from e
+
+    def render(self, storm_keys, animate=False):
+        """The page for ``storm_keys`` as UTF-8 bytes, from the cache when possible."""
+        _, archive_index, _ = self.archive
+        entries = [storm_entry(key, archive_index) for key in storm_keys]
+        # Every key must name exactly one storm; none is silently left off the map
+        for entry in entries:
+            self.find_storm(entry)
+        page_key = ('page', archive_index.sha256, json.dumps(entries, sort_keys=True), animate)
+        # Pages are built without a service-wide lock, so cache hits never wait behind a cold
+        # render; two requests for the same new page may both build it, with the same result
+        page = self.cache.get(page_key)
+        if page is None:
+            page = build_map(entries, archive=self.archive, layer_cache=self.cache, animate=animate)
+            self.cache.put(page_key, page, len(page))
+        return page
+
+    def with_analogs(self, storm_keys, key, count=DEFAULT_ANALOG_COUNT, since=None, until=None):
+        """``storm_keys`` as entries plus storm ``key`` and its ``count`` closest historical analogs."""
+        _, archive_index, _ = self.archive
+        storm = storm_entry(key, archive_index)
+        sid = self.find_storm(storm)
+        analogs = analog_entries(self.analog_index, archive_index, sid, count, since, until)
+        entries = [storm_entry(storm_key, archive_index) for storm_key in storm_keys]
+        return with_analogs(entries, dict(storm, sid=sid), analogs, archive_index)
+
+
+def _numbers(params, name, count, kind=float, minimum=None):
+    """The comma-separated ``name`` parameter as ``count`` numbers (each at least ``minimum``), or None when absent."""
+    if name not in params:
+        return None
+    values = params[name][-1].split(',')
+    if len(values) != count:
+        raise ValueError(f"{name} takes {count} comma-separated numbers")
+    numbers = [kind(value) for value in values]
+    if minimum is not None and min(numbers) < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return numbers
+
+
+def _storm_keys(query, service):
+    """Storm keys from ``storms`` query parameters (comma-separated and/or repeated) or a geographic
+    selection, plus the analogs asked for with ``analogs``."""
+    params = parse_qs(query)
+    bbox = _numbers(params, 'bbox', 4)
+    near = _numbers(params, 'near', 3)
+    region = params['region'][-1] if 'region' in params else None
+    since = _numbers(params, 'since', 1, int)
+    until = _numbers(params, 'until', 1, int)
+    since, until = since and since[0], until and until[0]
+    if bbox is None and near is None and region is None:
+        storm_keys = [key for value in params.get('storms', []) for key in value.split(',') if key.strip()]
+    else:
+        storm_keys = select_storms(service.spatial_index, bbox, near, region, since, until)
+    if 'analogs' in params:
+        count = _numbers(params, 'analog_count', 1, int, minimum=1)
+        storm_keys = service.with_analogs(storm_keys, params['analogs'][-1],
+                                          count[0] if count else DEFAULT_ANALOG_COUNT, since, until)
+    return storm_keys
+
+
+def make_handler(service):
+    """A request handler class bound to ``service``."""
+
+    class MapRequestHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, data):
+            self._send(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stats':
+                self._send_json(200, service.cache.stats())
+                return
+            if url.path not in ('/', '/map'):
+                self._send_json(404, {'error': f"Unknown path {url.path}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                storm_keys = _storm_keys(url.query, service) if url.path == '/map' else hurricanes
+                if not storm_keys:
+                    self._send_json(400, {'error': "No storms selected; pass ?storms=NAME|YEAR,... or storm IDs, "
+                                                   "a bbox, near or region that some storm crosses, or analogs=STORM"})
+                    return
+                animate = parse_qs(url.query).get('animate', ['0'])[-1] not in ('', '0', 'false')
+                page = service.render(storm_keys, animate)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                # Keep the server up and tell the client; the traceback goes to the log
+                self.log_error("failed to render %s: %r", self.path, e)
+                traceback.print_exc()
+                self._send_json(500, {'error': f"Internal error: {e}"})
+                return
+            self._send(200, page, 'text/html; charset=utf-8')
+            self.log_message("rendered %d storms in %.1f ms", len(storm_keys), (time.perf_counter() - start) * 1000)
+
+    return MapRequestHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve hurricane maps for any set of storms from a preloaded archive.')
+    parser.add_argument('--data', default=OUTPUT_FILE, help='IBTrACS CSV file (extract or full archive) to serve storms from')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB,
+                        help='memory budget in MB for cached storms and pages')
+    args = parser.parse_args(argv)
+
+    print(f"Loading {args.data}...")
+    service = MapService(args.data, cache_bytes=args.cache_mb << 20)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving maps on http://{args.host}:{args.port}/map?storms=NAME|YEAR,...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
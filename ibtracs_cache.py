@@ -0,0 +1,214 @@
+"""Columnar on-disk cache of parsed IBTrACS CSV files.
+
+The first time a CSV file is loaded it is parsed once into the column types
+declared in :mod:`ibtracs_schema` (float32 positions, small nullable integers,
+categorical codes, ISO_TIME as datetimes) and each column is written to its own
+``.npy`` file, with a separate mask file for integer columns that have missing
+values.  Later loads memory-map only the columns that are asked for and hand
+the maps to pandas without copying them, so repeat runs skip CSV parsing and
+type conversion entirely and processes loading the same archive share its
+pages.
+
+Every cache entry records the source file's size, modification time and
+SHA-256 hash.  A changed size or hash (for example a new IBTrACS release)
+rebuilds the entry automatically; a changed mtime with identical contents only
+refreshes the stored mtime.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ibtracs_schema import read_typed_csv
+
+# Default location of the cache, relative to the working directory
+CACHE_DIR = '.ibtracs_cache'
+
+# Bump when the on-disk layout changes so old entries are rebuilt
+CACHE_VERSION = 2
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _has_units_row(path):
+    """IBTrACS CSV files carry a units row under the header (SEASON reads 'Year'); extracts do not."""
+    with open(path, newline='') as f:
+        header = f.readline().rstrip('\r\n').split(',')
+        second = f.readline().rstrip('\r\n').split(',')
+    if 'SEASON' not in header or len(second) != len(header):
+        return False
+    return second[header.index('SEASON')].strip() == 'Year'
+
+
+def cache_location(source, cache_dir=CACHE_DIR):
+    """Directory holding the cache entry for ``source``."""
+    source = Path(source).resolve()
+    path_key = hashlib.sha1(str(source).encode()).hexdigest()[:8]
+    return Path(cache_dir) / f"{source.name}-{path_key}"
+
+
+def _read_manifest(entry):
+    try:
+        with open(entry / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(entry, manifest):
+    tmp = entry / (MANIFEST_FILE + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, entry / MANIFEST_FILE)
+
+
+def _is_fresh(entry, manifest, source):
+    stat = os.stat(source)
+    if manifest['size'] != stat.st_size:
+        return False
+    if manifest['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    # Same size but touched: only rebuild if the contents really changed
+    if _file_sha256(source) != manifest['sha256']:
+        return False
+    manifest['mtime_ns'] = stat.st_mtime_ns
+    _write_manifest(entry, manifest)
+    return True
+
+
+def _column_arrays(values):
+    """Split one typed column into its stored array, missing-value mask (or None) and metadata."""
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Codes keep the narrow integer type pandas picked for the number of categories
+        meta = {'kind': 'category', 'categories': [str(c) for c in dtype.categories]}
+        return values.cat.codes.to_numpy(), None, meta
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        # Nullable integers: zeros stand in for missing values, which the mask marks
+        mask = values.isna().to_numpy()
+        array = values.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+        return array, mask if mask.any() else None, {'kind': 'int'}
+    if dtype.kind == 'M':
+        return values.to_numpy(dtype='datetime64[ns]'), None, {'kind': 'datetime'}
+    return values.to_numpy(), None, {'kind': 'float'}
+
+
+def _build(source, entry):
+    print(f"Building column cache for {source}...")
+    raw = read_typed_csv(source, skiprows=[1] if _has_units_row(source) else None)
+
+    stat = os.stat(source)
+    manifest = {
+        'version': CACHE_VERSION,
+        'source': str(Path(source).resolve()),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _file_sha256(source),
+        'rows': len(raw),
+        'columns': {},
+    }
+
+    # Write into a scratch directory and swap it in so readers never see a half-built entry
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(prefix=entry.name + '.', dir=entry.parent))
+    try:
+        for position, name in enumerate(raw.columns):
+            array, mask, meta = _column_arrays(raw[name])
+            meta['file'] = f"{position:03d}.npy"
+            np.save(scratch / meta['file'], array, allow_pickle=False)
+            if mask is not None:
+                meta['mask_file'] = f"{position:03d}.mask.npy"
+                np.save(scratch / meta['mask_file'], mask, allow_pickle=False)
+            manifest['columns'][name] = meta
+        _write_manifest(scratch, manifest)
+        if entry.exists():
+            shutil.rmtree(entry)
+        os.replace(scratch, entry)
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    return manifest
+
+
+def ensure_cache(source, cache_dir=CACHE_DIR):
+    """Return ``(entry_dir, manifest)`` for ``source``, (re)building the cache entry if it is stale."""
+    entry = cache_location(source, cache_dir)
+    manifest = _read_manifest(entry)
+    if manifest is None or not _is_fresh(entry, manifest, source):
+        manifest = _build(source, entry)
+    return entry, manifest
+
+
+def cached_artifact(source, name, columns, build, load, stamp=lambda artifact: (artifact.sha256, artifact.rows),
+                    save=lambda artifact, path: artifact.save(path), cache_dir=CACHE_DIR):
+    """Load the artifact stored as ``name`` with ``source``'s column cache, building it if it is missing or stale.
+
+    Indexes and tables derived from an archive live next to its column cache
+    and are rebuilt whenever the cache is.  ``load(path)`` reads a stored
+    artifact and ``stamp(artifact)`` gives the ``(sha256, rows)`` of the archive
+    it was built from (by default its ``sha256`` and ``rows`` attributes).
+    ``build(df, sha256)`` builds it from ``columns`` of the archive, those the
+    archive has, and ``save(artifact, path)`` (by default its ``save`` method)
+    stores it.
+    """
+    entry, manifest = ensure_cache(source, cache_dir)
+    path = entry / name
+    if path.exists():
+        artifact = load(path)
+        if stamp(artifact) == (manifest['sha256'], manifest['rows']):
+            return artifact
+
+    print(f"Building {name} for {source}...")
+    df = load_ibtracs(source, columns=[column for column in columns if column in manifest['columns']],
+                      cache_dir=cache_dir)
+    artifact = build(df, manifest['sha256'])
+    save(artifact, path)
+    return artifact
+
+
+def _load_column(entry, meta):
+    array = np.load(entry / meta['file'], mmap_mode='r', allow_pickle=False)
+    if meta['kind'] == 'category':
+        return pd.Categorical.from_codes(np.asarray(array), categories=meta['categories'])
+    if meta['kind'] == 'int':
+        if 'mask_file' in meta:
+            mask = np.load(entry / meta['mask_file'], mmap_mode='r', allow_pickle=False)
+        else:
+            mask = np.zeros(len(array), dtype=bool)
+        return pd.arrays.IntegerArray(np.asarray(array), mask)
+    return array
+
+
+def load_ibtracs(source, columns=None, cache_dir=CACHE_DIR):
+    """Load ``columns`` (default: all) of an IBTrACS-format CSV file through the column cache.
+
+    Pass ``cache_dir=None`` to bypass the cache and parse the CSV directly.
+    """
+    if cache_dir is None:
+        return read_typed_csv(source, skiprows=[1] if _has_units_row(source) else None, usecols=columns)
+
+    entry, manifest = ensure_cache(source, cache_dir)
+    if columns is None:
+        columns = list(manifest['columns'])
+    missing = [name for name in columns if name not in manifest['columns']]
+    if missing:
+        raise KeyError(f"Columns not found in {source}: {', '.join(missing)}")
+    # copy=False keeps the columns backed by the read-only memory maps, so processes
+    # loading the same archive share its pages through the OS page cache
+    return pd.DataFrame({name: _load_column(entry, manifest['columns'][name]) for name in columns}, copy=False)
@@ -0,0 +1,205 @@
+"""Declared column types for IBTrACS CSV files and a typed parser built on them.
+
+IBTrACS writes a single space for every missing value, so a plain
+``read_csv`` sees almost every column as text.  Here each column has a
+declared type, and the CSV is parsed straight into it:
+
+- positions (``LAT``, ``LON``, ``*_LAT``, ``*_LON``) and Dvorak-style
+  fractional values as float32
+- winds, pressures, radii, distances and other integer quantities as
+  nullable Int16, and category codes such as ``USA_SSHS`` as nullable Int8
+- names, basins, natures, agencies and other labels as categoricals
+- ``ISO_TIME`` as datetimes, parsed once with the archive's fixed format
+
+Blank and single-space fields are NA at parse time.  Integer columns are
+parsed as float32 first and only narrowed when every value is integral and in
+range, so a surprising value widens the column rather than being lost.
+Columns with no declared type (e.g. in other CSV layouts) fall back to
+inference from the text.
+
+``python ibtracs_schema.py --source FILE`` prints the memory used by every
+column, optionally against the untyped all-text load.
+"""
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+CATEGORY = 'category'
+DATETIME = 'datetime'
+FLOAT32 = 'float32'
+INT8 = 'Int8'
+INT16 = 'Int16'
+
+# Values IBTrACS (and extracts written by pandas) use for a missing field
+NA_VALUES = [' ', '']
+
+ISO_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# IBTrACS positions carry at most this many decimals, so rounding a float32
+# position to it gives back the value written in the file
+POSITION_DECIMALS = 4
+
+COLUMN_TYPES = {
+    'SID': CATEGORY,
+    'SEASON': INT16,
+    'NUMBER': INT16,
+    'BASIN': CATEGORY,
+    'SUBBASIN': CATEGORY,
+    'NAME': CATEGORY,
+    'ISO_TIME': DATETIME,
+    'NATURE': CATEGORY,
+    'LAT': FLOAT32,
+    'LON': FLOAT32,
+    'WMO_AGENCY': CATEGORY,
+    'TRACK_TYPE': CATEGORY,
+    'DIST2LAND': INT16,
+    'LANDFALL': INT16,
+    'IFLAG': CATEGORY,
+    'USA_AGENCY': CATEGORY,
+    'USA_ATCF_ID': CATEGORY,
+    'USA_RECORD': CATEGORY,
+    'USA_STATUS': CATEGORY,
+    'USA_SSHS': INT8,
+    'TOKYO_GRADE': INT8,
+    'TOKYO_LAND': INT8,
+    'CMA_CAT': INT8,
+    'STORM_SPEED': INT16,
+    'STORM_DIR': INT16,
+}
+
+# Types of the agency-specific columns, by name pattern; the first match wins
+PATTERN_TYPES = [
+    (r'_(LAT|LON)$', FLOAT32),
+    (r'_(CI|TNUM|DP)$', FLOAT32),
+    (r'_(WIND|PRES|GUST|GUST_PER|POCI|ROCI|RMW|EYE|SEAHGT)$', INT16),
+    (r'_(R34|R50|R64|SEARAD)_(NE|SE|SW|NW)$', INT16),
+    (r'_R(30|50)_(DIR|LONG|SHORT)$', INT16),
+    (r'_(CAT|GRADE|TYPE|STAGE|CLASS|POS_METHOD|PRES_METHOD)$', CATEGORY),
+]
+
+_INT_RANGES = {INT8: np.iinfo(np.int8), INT16: np.iinfo(np.int16)}
+
+
+def column_type(name):
+    """Declared type of column ``name``, or None when it has to be inferred."""
+    if name in COLUMN_TYPES:
+        return COLUMN_TYPES[name]
+    for pattern, kind in PATTERN_TYPES:
+        if re.search(pattern, name):
+            return kind
+    return None
+
+
+def _parse_dtype(kind):
+    """dtype handed to ``read_csv`` for a column of declared type ``kind``."""
+    if kind in (FLOAT32, INT8, INT16):
+        return 'float32'
+    if kind == CATEGORY:
+        return 'category'
+    return str
+
+
+def narrow_integers(values, kind):
+    """Float32 values as nullable ``kind`` integers, or unchanged if any is fractional or out of range."""
+    array = np.asarray(values, dtype='float32')
+    present = array[~np.isnan(array)]
+    limits = _INT_RANGES[kind]
+    if len(present) and (np.any(present != np.round(present))
+                         or present.min() < limits.min or present.max() > limits.max):
+        return pd.Series(array)
+    return pd.Series(array).astype(kind)
+
+
+def infer_column(values):
+    """Type a column of text with no declared type: numbers, else categories."""
+    values = values.str.strip()
+    missing = values.isna() | (values == '')
+    numbers = pd.to_numeric(values.where(~missing), errors='coerce')
+    if numbers.notna().sum() == (~missing).sum():
+        return numbers.astype('float64')
+    return values.where(~missing).astype('category')
+
+
+def type_columns(raw, columns, declared=True):
+    """Finish typing the columns of a frame parsed with :func:`parse_dtypes`.
+
+    With ``declared=False`` (a frame read entirely as text) every column but
+    ``ISO_TIME`` is inferred instead.
+    """
+    typed = {}
+    for name in columns:
+        kind = column_type(name)
+        if not declared and kind != DATETIME:
+            kind = None
+        values = raw[name]
+        if kind in (INT8, INT16):
+            typed[name] = narrow_integers(values, kind)
+        elif kind == DATETIME:
+            typed[name] = pd.to_datetime(values, format=ISO_TIME_FORMAT, errors='coerce').astype('datetime64[ns]')
+        elif kind is None:
+            typed[name] = infer_column(values)
+        else:
+            typed[name] = values
+    return pd.DataFrame(typed)
+
+
+def parse_dtypes(columns):
+    """``read_csv`` dtypes for ``columns``."""
+    return {name: _parse_dtype(column_type(name)) for name in columns}
+
+
+def read_typed_csv(source, skiprows=None, usecols=None):
+    """Parse an IBTrACS-layout CSV straight into the declared column types.
+
+    A file whose values do not fit the schema (text in a numeric column) is
+    read as text instead and every column's type is inferred.
+    """
+    header = pd.read_csv(source, nrows=0, skiprows=skiprows).columns
+    columns = [name for name in header if usecols is None or name in usecols]
+    try:
+        raw = pd.read_csv(source, skiprows=skiprows, usecols=columns, dtype=parse_dtypes(columns),
+                          na_values=NA_VALUES, keep_default_na=False)
+    except ValueError as e:
+        print(f"Warning: {source} does not match the IBTrACS schema ({e}); inferring column types instead")
+        raw = pd.read_csv(source, skiprows=skiprows, usecols=columns, dtype=str,
+                          na_values=NA_VALUES, keep_default_na=False)
+        return type_columns(raw, columns, declared=False)
+    return type_columns(raw, columns)
+
+
+def memory_report(df):
+    """Bytes per column (deep), largest first, with dtypes and a total row."""
+    usage = df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({'dtype': df.dtypes.astype(str), 'bytes': usage})
+    report = report.sort_values('bytes', ascending=False)
+    report.loc['TOTAL'] = ['', int(usage.sum())]
+    return report
+
+
+def main(argv=None):
+    from ibtracs_cache import CACHE_DIR, _has_units_row, load_ibtracs
+
+    parser = argparse.ArgumentParser(description='Report per-column memory of an IBTrACS CSV loaded with the typed schema.')
+    parser.add_argument('--source', required=True, help='IBTrACS CSV file to load')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='directory for the parsed column cache')
+    parser.add_argument('--compare-text', action='store_true',
+                        help='also load the file as untyped text and compare total memory')
+    parser.add_argument('--top', type=int, default=20, help='number of columns to list')
+    args = parser.parse_args(argv)
+
+    typed = memory_report(load_ibtracs(args.source, cache_dir=args.cache_dir))
+    total = typed.loc['TOTAL', 'bytes']
+    print(typed.drop('TOTAL').head(args.top).to_string())
+    print(f"Typed total: {total / 2**20:.1f} MB over {len(typed) - 1} columns")
+
+    if args.compare_text:
+        text = pd.read_csv(args.source, skiprows=[1] if _has_units_row(args.source) else None,
+                           dtype=object, keep_default_na=False)
+        text_total = int(text.memory_usage(index=False, deep=True).sum())
+        print(f"Untyped text total: {text_total / 2**20:.1f} MB ({text_total / total:.1f}x the typed load)")
+
+
+if __name__ == '__main__':
+    main()
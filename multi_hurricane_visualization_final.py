@@ -1,28 +1,37 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import folium
-import numpy as np
-from datetime import datetime
-import json
 
-# Fix for NumPy int64 JSON serialization issue
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super(NumpyEncoder, self).default(obj)
+from analogs import AnalogIndex, add_analog_arguments, analog_entries
+from animation import add_animation, animation_frames
+from boundaries import add_boundaries
+from extract_hurricane_data import OUTPUT_FILE, VISUALIZER_COLUMNS
+from fragment_cache import FragmentCache, code_digest, storm_digest
+from ibtracs_cache import load_ibtracs
+from ibtracs_schema import POSITION_DECIMALS
+import profiling
+from spatial_index import SpatialIndex, add_selection_arguments, has_selection, select_storms
+from storm_index import StormIndex, storm_entry
+from storm_metrics import compute_metrics, describe, load_metrics, peak_label
+from storm_layers import STORM_LAYER_JS, StormLayer, layer_count, serialize_payload, storm_payload, track_points
+from track_encoding import write_compressed
+import storm_layers
+import storm_metrics
+import track_encoding
 
-# Load the smaller extracted CSV file
-print("Loading CSV file...")
-df = pd.read_csv('hurricane_data_extracted.csv', low_memory=False)
+# Default output page
+MAP_FILE = 'multiple_hurricane_tracks_final.html'
 
-# Convert SEASON to numeric, coercing errors to NaN
-df['SEASON'] = pd.to_numeric(df['SEASON'], errors='coerce')
+# Source files whose code shapes a storm's fragment; editing any of them invalidates cached fragments
+FRAGMENT_SOURCES = [__file__, storm_layers.__file__, storm_metrics.__file__, track_encoding.__file__]
 
 # Define the hurricanes we want to visualize
+# An entry may also carry a 'sid' to pick one storm when a name is shared (e.g. UNNAMED)
 hurricanes = [
     {'name': 'IRENE', 'year': 2011},
     {'name': 'ANDREW', 'year': 1992},
@@ -33,288 +42,8 @@ hurricanes = [
     {'name': 'HELENE', 'year': 2024}
 ]
 
-# Create a map centered on the Atlantic
-hurricane_map = folium.Map(location=[25, -70], zoom_start=4, tiles='CartoDB positron')
-
-# Add US state boundaries
-folium.GeoJson(
-    'https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/us-states.json',
-    name='US States',
-    style_function=lambda x: {
-        'fillColor': 'transparent',
-        'color': 'gray',
-        'weight': 1
-    }
-).add_to(hurricane_map)
-
-# Define colors for hurricane categories
-cat_colors = {
-    -3: 'gray',     # Not designated
-    -2: 'gray',     # Not designated
-    -1: 'blue',     # Tropical Depression
-    0: 'green',     # Tropical Storm
-    1: 'yellow',    # Category 1
-    2: 'orange',    # Category 2
-    3: 'red',       # Category 3
-    4: 'purple',    # Category 4
-    5: 'darkred'    # Category 5
-}
-
-# Store coordinates for calculating map bounds
-all_lats = []
-all_lons = []
-
-# Store hurricane information for the info panel
-hurricane_info = []
-
-# Process each hurricane
-for hurricane in hurricanes:
-    print(f"Processing Hurricane {hurricane['name']} ({hurricane['year']})...")
-    
-    # Filter for this hurricane by name and year
-    # Convert to strings to handle any numeric values
-    name_matches = df[(df['NAME'].astype(str).str.strip() == hurricane['name']) & 
-                      (df['SEASON'].astype(int) == hurricane['year'])]
-    
-    if len(name_matches) == 0:
-        print(f"No exact match found for {hurricane['name']} in {hurricane['year']}")
-        # Try a more flexible approach
-        name_matches = df[(df['NAME'].astype(str).str.contains(hurricane['name'], case=False, na=False)) & 
-                          (df['SEASON'].astype(int) == hurricane['year'])]
-    
-    # Check if we found any data
-    if len(name_matches) == 0:
-        print(f"No data found for Hurricane {hurricane['name']} in {hurricane['year']}")
-        continue
-    
-    print(f"Found {len(name_matches)} data points for Hurricane {hurricane['name']}")
-    
-    # Convert ISO_TIME to datetime for sorting
-    hurricane_data = name_matches.copy()
-    hurricane_data.loc[:, 'ISO_TIME'] = pd.to_datetime(hurricane_data['ISO_TIME'], errors='coerce')
-    
-    # Drop rows with invalid dates
-    hurricane_data = hurricane_data.dropna(subset=['ISO_TIME'])
-    
-    # Sort by time
-    hurricane_data = hurricane_data.sort_values('ISO_TIME')
-    
-    if len(hurricane_data) == 0:
-        print(f"No valid time data for Hurricane {hurricane['name']}")
-        continue
-    
-    print(f"Date range: {hurricane_data['ISO_TIME'].min()} to {hurricane_data['ISO_TIME'].max()}")
-    
-    # Extract coordinates
-    track_data = hurricane_data[['LAT', 'LON', 'USA_SSHS', 'USA_WIND', 'ISO_TIME']].copy()
-    
-    # Convert to numeric and drop NaN values
-    track_data['LAT'] = pd.to_numeric(track_data['LAT'], errors='coerce')
-    track_data['LON'] = pd.to_numeric(track_data['LON'], errors='coerce')
-    track_data = track_data.dropna(subset=['LAT', 'LON'])
-    
-    if len(track_data) == 0:
-        print(f"No valid coordinate data for Hurricane {hurricane['name']}")
-        continue
-    
-    coordinates = track_data[['LAT', 'LON']].values.tolist()
-    
-    # Store coordinates for map bounds
-    all_lats.extend(track_data['LAT'].tolist())
-    all_lons.extend(track_data['LON'].tolist())
-    
-    # Get peak intensity for info panel
-    max_sshs = pd.to_numeric(track_data['USA_SSHS'], errors='coerce').max()
-    peak_category = 'N/A'
-    if not pd.isna(max_sshs):
-        if max_sshs >= 1:
-            peak_category = f'Category {int(max_sshs)}'
-        elif max_sshs == 0:
-            peak_category = 'Tropical Storm'
-        elif max_sshs == -1:
-            peak_category = 'Tropical Depression'
-        else:
-            peak_category = 'Not designated'
-    
-    # Store hurricane info for the panel
-    hurricane_info.append({
-        'name': hurricane['name'],
-        'year': hurricane['year'],
-        'peak': peak_category,
-        'start_date': hurricane_data['ISO_TIME'].min().strftime('%B %d, %Y'),
-        'end_date': hurricane_data['ISO_TIME'].max().strftime('%B %d, %Y'),
-        'max_wind': int(track_data['USA_WIND'].max()) if not pd.isna(track_data['USA_WIND'].max()) else 'N/A'
-    })
-    
-    # Create a full track line with popup containing hurricane info
-    popup_html = f"""
-    <div style="width:300px; max-height:300px; overflow-y:auto;">
-        <h3>{hurricane['name']} ({hurricane['year']})</h3>
-        <p><strong>Peak Intensity:</strong> {peak_category}</p>
-        <p><strong>Active:</strong> {hurricane_data['ISO_TIME'].min().strftime('%B %d')} - {hurricane_data['ISO_TIME'].max().strftime('%B %d, %Y')}</p>
-        <p><strong>Maximum Wind Speed:</strong> {int(track_data['USA_WIND'].max()) if not pd.isna(track_data['USA_WIND'].max()) else 'N/A'} mph</p>
-        <p><strong>Description:</strong></p>
-        <p>{'Hurricane ' + hurricane['name'] + ' was a powerful ' + ('Category ' + str(int(max_sshs)) if not pd.isna(max_sshs) and max_sshs >= 1 else 'tropical cyclone') + ' that affected ' + ('the Caribbean and U.S. East Coast' if hurricane['name'] == 'IRENE' else 'Florida and the Bahamas' if hurricane['name'] == 'ANDREW' else 'western Cuba and Florida' if hurricane['name'] == 'IAN' else 'Louisiana and the Gulf Coast' if hurricane['name'] == 'IDA' else 'Florida and the Gulf Coast' if hurricane['name'] == 'MILTON' else 'Florida and the Southeast' if hurricane['name'] == 'IDALIA' else 'the Southeast U.S. and Appalachian region')}</p>
-    </div>
-    """
-    
-    # Add a thicker, more clickable black line for the entire track with popup
-    # Use IFrame for more reliable popup rendering
-    iframe = folium.IFrame(html=popup_html, width=320, height=250)
-    popup = folium.Popup(iframe, max_width=350)
-    
-    # Instead of a single PolyLine, create a GeoJson object for better interactivity
-    hurricane_track = {
-        'type': 'Feature',
-        'geometry': {
-            'type': 'LineString',
-            'coordinates': [[float(coord[1]), float(coord[0])] for coord in coordinates]  # GeoJSON uses [lon, lat] format
-        },
-        'properties': {
-            'name': hurricane['name'],
-            'year': int(hurricane['year']),
-            'peak': peak_category,
-            'start_date': hurricane_data['ISO_TIME'].min().strftime('%B %d, %Y'),
-            'end_date': hurricane_data['ISO_TIME'].max().strftime('%B %d, %Y'),
-            'max_wind': int(track_data['USA_WIND'].max()) if not pd.isna(track_data['USA_WIND'].max()) else 'N/A'
-        }
-    }
-    
-    # Add the track as a GeoJson object with style and popup functions
-    folium.GeoJson(
-        hurricane_track,
-        name=f"{hurricane['name']} {hurricane['year']}",
-        style_function=lambda x: {
-            'color': 'black',
-            'weight': 5,
-            'opacity': 0.6,
-        },
-        tooltip=f"Click for details on {hurricane['name']} ({hurricane['year']})",
-        popup=popup
-    ).add_to(hurricane_map)
-    
-    # Create colored line segments based on intensity
-    for i in range(len(coordinates) - 1):
-        # Get the category and corresponding color
-        category = track_data.iloc[i]['USA_SSHS'] if not pd.isna(track_data.iloc[i]['USA_SSHS']) else -3
-        color = cat_colors.get(int(category) if not pd.isna(category) else -3, 'gray')
-        
-        # Get wind speed for tooltip
-        wind_speed = track_data.iloc[i]['USA_WIND'] if not pd.isna(track_data.iloc[i]['USA_WIND']) else 'N/A'
-        
-        # Format date
-        date_str = track_data.iloc[i]['ISO_TIME'].strftime('%Y-%m-%d %H:%M')
-        
-        # Create tooltip text - put storm name first as required
-        tooltip_text = f"{hurricane['name']} | {date_str} | Wind: {wind_speed} mph | Lat: {coordinates[i][0]:.2f}, Lon: {coordinates[i][1]:.2f}"
-        
-        # Create a line segment between consecutive points
-        segment = [coordinates[i], coordinates[i+1]]
-        
-        # Create popup content for this segment
-        segment_popup_html = f"""
-        <div style="width:250px;">
-            <h4>{hurricane['name']} ({hurricane['year']})</h4>
-            <p><strong>Date:</strong> {date_str}</p>
-            <p><strong>Wind Speed:</strong> {wind_speed} mph</p>
-            <p><strong>Category:</strong> {int(category) if not pd.isna(category) and category >= 0 else 'TD/TS' if not pd.isna(category) and category >= -1 else 'Not designated'}</p>
-            <p><strong>Location:</strong> {coordinates[i][0]:.2f}°, {coordinates[i][1]:.2f}°</p>
-        </div>
-        """
-        
-        # Use IFrame for reliable popup rendering
-        segment_iframe = folium.IFrame(html=segment_popup_html, width=270, height=180)
-        segment_popup = folium.Popup(segment_iframe, max_width=300)
-        
-        # Create a GeoJSON feature for this segment
-        segment_feature = {
-            'type': 'Feature',
-            'geometry': {
-                'type': 'LineString',
-                'coordinates': [[float(segment[0][1]), float(segment[0][0])], [float(segment[1][1]), float(segment[1][0])]]  # GeoJSON uses [lon, lat]
-            },
-            'properties': {
-                'name': hurricane['name'],
-                'date': date_str,
-                'wind': float(wind_speed) if isinstance(wind_speed, (int, float, np.number)) else wind_speed,
-                'category': int(category) if not pd.isna(category) and category >= 0 else 'TD/TS' if not pd.isna(category) and category >= -1 else 'Not designated'
-            }
-        }
-        
-        # Add the segment as a colored PolyLine for better visibility of intensity
-        # We'll use both approaches: GeoJSON for clickability and PolyLine for coloring
-        
-        # First add the colored PolyLine (for visual representation)
-        folium.PolyLine(
-            segment,
-            color=color,
-            weight=5,
-            opacity=0.8,
-            tooltip=tooltip_text
-        ).add_to(hurricane_map)
-        
-        # Then add an invisible GeoJson object on top (for better click handling)
-        folium.GeoJson(
-            segment_feature,
-            style_function=lambda x: {
-                'color': 'transparent',  # Make it transparent
-                'weight': 8,  # Make it wider for easier clicking
-                'opacity': 0.0  # Fully transparent
-            },
-            tooltip=tooltip_text,
-            popup=segment_popup
-        ).add_to(hurricane_map)
-    
-    # Add markers for start, middle, and end points
-    marker_points = [
-        (0, "Start"),
-        (len(track_data) // 2, "Middle"),
-        (len(track_data) - 1, "End")
-    ]
-    
-    for idx, label in marker_points:
-        row = track_data.iloc[idx]
-        category = row['USA_SSHS'] if not pd.isna(row['USA_SSHS']) else -3
-        color = cat_colors.get(int(category) if not pd.isna(category) else -3, 'gray')
-        
-        # Create popup content
-        date_str = row['ISO_TIME'].strftime('%Y-%m-%d %H:%M')
-        wind_speed = row['USA_WIND'] if not pd.isna(row['USA_WIND']) else 'N/A'
-        
-        popup_text = f"""
-        <div>
-            <h4>{hurricane['name']} ({hurricane['year']}) - {label} Point</h4>
-            <p><strong>Date:</strong> {date_str}</p>
-            <p><strong>Location:</strong> {row['LAT']:.2f}°, {row['LON']:.2f}°</p>
-            <p><strong>Wind Speed:</strong> {wind_speed} mph</p>
-            <p><strong>Category:</strong> {int(category) if not pd.isna(category) and category >= 0 else 'TD/TS' if not pd.isna(category) and category >= -1 else 'Not designated'}</p>
-        </div>
-        """
-        
-        # Add marker with IFrame popup for better rendering
-        iframe = folium.IFrame(html=popup_text, width=300, height=200)
-        popup = folium.Popup(iframe, max_width=300)
-        
-        folium.CircleMarker(
-            location=[row['LAT'], row['LON']],
-            radius=8,
-            color='black',
-            weight=1,
-            fill=True,
-            fill_color=color,
-            fill_opacity=0.9,
-            popup=popup,
-            tooltip=f"{hurricane['name']} ({hurricane['year']}) - {label}"
-        ).add_to(hurricane_map)
-
-# Calculate the bounding box for all hurricanes to set appropriate map view
-if all_lats and all_lons:
-    southwest = [min(all_lats), min(all_lons)]
-    northeast = [max(all_lats), max(all_lons)]
-    hurricane_map.fit_bounds([southwest, northeast])
-
 # Add a title
-title_html = '''
+TITLE_HTML = '''
 <div style="position: fixed; 
     top: 10px; left: 50%; transform: translateX(-50%);
     z-index:9999; font-size:18px; font-weight: bold; background-color:white; 
@@ -322,10 +51,9 @@ title_html = '''
     Multiple Hurricane Tracks Visualization
 </div>
 '''
-hurricane_map.get_root().html.add_child(folium.Element(title_html))
 
 # Add a legend
-legend_html = '''
+LEGEND_HTML = '''
 <div style="position: fixed; 
     bottom: 50px; left: 10px; 
     z-index:9999; font-size:12px; background-color:white; 
@@ -342,10 +70,9 @@ legend_html = '''
     <div style="font-style: italic; margin-top: 5px; font-size: 10px;">Click on lines or markers for more information</div>
 </div>
 '''
-hurricane_map.get_root().html.add_child(folium.Element(legend_html))
 
 # Add instructions
-instructions_html = '''
+INSTRUCTIONS_HTML = '''
 <div style="position: fixed; 
     top: 10px; left: 10px; 
     z-index:9999; font-size:12px; background-color:white; 
@@ -356,59 +83,481 @@ instructions_html = '''
     <div>• Colors indicate hurricane intensity category</div>
 </div>
 '''
-hurricane_map.get_root().html.add_child(folium.Element(instructions_html))
 
-# Create the HTML for the information panel with vertical scrolling
-info_panel_html = '''
-<div style="position: fixed; 
-    top: 150px; left: 10px; 
-    z-index:9999; font-size:12px; background-color:white; 
-    padding:10px; border-radius:5px; border:1px solid gray; opacity:0.9;
-    max-height: 35vh; overflow-y: auto; width: 250px;">
-    <div style="font-weight: bold; margin-bottom: 10px; text-align: center; font-size: 14px; position: sticky; top: 0; background-color: white; padding: 5px 0;">Hurricane Summary</div>
-'''
 
-# Add each hurricane to the info panel
-for info in hurricane_info:
-    info_panel_html += f'''
-    <div style="margin-bottom: 10px; padding-bottom: 5px; border-bottom: 1px solid #eee;">
-        <div style="font-weight: bold; color: #333;">{info['name']} ({info['year']})</div>
-        <div>Peak Intensity: <span style="color: {'red' if 'Category' in info['peak'] and int(info['peak'].split()[1]) >= 3 else 'orange' if 'Category' in info['peak'] and int(info['peak'].split()[1]) >= 1 else 'green'}">{info['peak']}</span></div>
-        <div>Active: {info['start_date']} to {info['end_date']}</div>
-        <div>Max Wind: {info['max_wind']} mph</div>
+def load_archive(data_file=OUTPUT_FILE):
+    """Load the track columns, storm index and storm metrics for ``data_file``.
+    
+    The column cache already holds SEASON, LAT, LON, USA_WIND and USA_SSHS as numbers and
+    ISO_TIME as datetimes; the index maps SID -> rows and (name, season) -> SIDs, so each
+    storm is a lookup rather than a scan.  The metrics table (see storm_metrics) holds
+    every storm's panel and popup summary, computed once for the whole archive.
+    """
+    with profiling.stage('load_archive', data_file=data_file) as counters:
+        df = load_ibtracs(data_file, columns=VISUALIZER_COLUMNS)
+        archive_index = StormIndex.for_archive(data_file)
+        metrics = load_metrics(data_file)
+        counters['rows'] = len(df)
+    return df, archive_index, metrics
+
+
+def find_storm(archive_index, hurricane):
+    """The storm ID for one entry of the ``hurricanes`` list.
+    
+    Raises KeyError when the entry matches no storm and AmbiguousStormError when its
+    name and year match several (see :meth:`StormIndex.resolve`).
+    """
+    print(f"Processing Hurricane {hurricane['name']} ({hurricane['year']})...")
+    
+    if 'sid' in hurricane:
+        if hurricane['sid'] not in archive_index:
+            raise KeyError(f"No storm {hurricane['sid']} in the archive")
+        return hurricane['sid']
+    return archive_index.resolve(hurricane['name'], hurricane['year'])
+
+
+def info_panel_entry(info):
+    """One storm's entry in the summary panel."""
+    analog = (f"<div style=\"font-style: italic;\">Analog of {info['analog_of']} ({info['analog_km']:,} km mean track distance)</div>"
+              if 'analog_of' in info else '')
+    return f'''
+        <div style="margin-bottom: 10px; padding-bottom: 5px; border-bottom: 1px solid #eee;">
+            <div style="font-weight: bold; color: #333;">{info['name']} ({info['year']})</div>
+            <div>Peak Intensity: <span style="color: {'red' if 'Category' in info['peak'] and int(info['peak'].split()[1]) >= 3 else 'orange' if 'Category' in info['peak'] and int(info['peak'].split()[1]) >= 1 else 'green'}">{info['peak']}</span></div>
+            <div>Active: {info['start_date']} to {info['end_date']}</div>
+            <div>Max Wind: {info['max_wind']} kt</div>
+            <div>ACE: {info['ace']:.1f} | Landfalls: {info['landfalls']}</div>
+            {analog}
+        </div>
+        '''
+
+
+def build_storm(df, archive_index, hurricane, sid=None, metrics=None):
+    """Everything one storm contributes to the map: its serialized layer, panel entry, info and bounds.
+    
+    ``sid`` skips the lookup when the caller has already resolved the entry;
+    otherwise :func:`find_storm` resolves it and raises when it cannot.
+    The storm's summary is read from the archive's ``metrics`` table, or computed
+    from its rows when no table is given.
+    Returns None when the storm has no usable track.
+    """
+    if sid is None:
+        sid = find_storm(archive_index, hurricane)
+    
+    with profiling.stage('storm', name=hurricane['name'], year=hurricane['year'], sid=sid) as counters:
+        result = _storm_result(hurricane, sid, archive_index.track(df, sid), metrics)
+        if result is not None:
+            counters['layers'] = result['layers']
+            counters['serialized_bytes'] = len(result['layer'])
+    return result
+
+
+def _storm_result(hurricane, sid, name_matches, metrics=None):
+    """:func:`build_storm` for one storm's rows, as returned by the storm index."""
+    print(f"Found {len(name_matches)} data points for Hurricane {hurricane['name']}")
+    
+    with profiling.stage('prepare_track'):
+        # ISO_TIME, LAT and LON arrive typed by the loader (see ibtracs_schema), with
+        # unparseable values already missing, so no per-storm conversion is needed
+        # Drop rows with invalid dates and sort by time
+        hurricane_data = name_matches.dropna(subset=['ISO_TIME']).sort_values('ISO_TIME')
+    
+        if len(hurricane_data) == 0:
+            print(f"No valid time data for Hurricane {hurricane['name']}")
+            return None
+    
+        print(f"Date range: {hurricane_data['ISO_TIME'].min()} to {hurricane_data['ISO_TIME'].max()}")
+    
+        # Extract coordinates, dropping points without a position
+        track_data = hurricane_data[['LAT', 'LON', 'USA_SSHS', 'USA_WIND', 'ISO_TIME']].dropna(subset=['LAT', 'LON'])
+    
+        if len(track_data) == 0:
+            print(f"No valid coordinate data for Hurricane {hurricane['name']}")
+            return None
+    
+    # Peak intensity, dates and the rest of the summary come from the metrics table
+    if metrics is None or sid not in metrics.index:
+        metrics = compute_metrics(name_matches)
+    summary = metrics.loc[sid]
+    peak_category = peak_label(summary['peak_sshs'])
+    max_wind = int(summary['peak_wind']) if not pd.isna(summary['peak_wind']) else 'N/A'
+    
+    # Hurricane information for the panel
+    info = {
+        'name': hurricane['name'],
+        'year': hurricane['year'],
+        'peak': peak_category,
+        'start_date': summary['start'].strftime('%B %d, %Y'),
+        'end_date': summary['end'].strftime('%B %d, %Y'),
+        'max_wind': max_wind,
+        'ace': float(summary['ace']),
+        'landfalls': int(summary['landfalls'])
+    }
+    # Analog entries (see analogs.analog_entries) name the storm they resemble
+    analog = {key: hurricane[key] for key in ('analog_of', 'analog_km') if key in hurricane}
+    info.update(analog)
+    
+    with profiling.stage('track_points'):
+        # Per-point display fields (category, color, wind, time) for the whole track at once
+        points = track_points(track_data)
+    
+    # Markers for start, middle, and end points
+    marker_points = [
+        (0, "Start"),
+        (len(track_data) // 2, "Middle"),
+        (len(track_data) - 1, "End")
+    ]
+    
+    with profiling.stage('storm_payload'):
+        # The storm's track (stored once, as encoded coordinates), per-point attributes,
+        # intensity runs and markers; the page draws all of its layers from this payload
+        payload = storm_payload(points, sid, {
+            'name': hurricane['name'],
+            'year': int(hurricane['year']),
+            'peak': peak_category,
+            'active': f"{summary['start'].strftime('%B %d')} - {summary['end'].strftime('%B %d, %Y')}",
+            'max_wind': max_wind,
+            'description': describe(summary),
+            **analog
+        }, marker_points)
+    
+    with profiling.stage('serialize'):
+        layer = serialize_payload(payload)
+        panel = info_panel_entry(info)
+    
+    return {
+        'sid': sid,
+        'layer': layer,
+        'panel': panel,
+        'info': info,
+        'layers': layer_count(payload),
+        # Store coordinates for map bounds
+        'bounds': [round(float(value), POSITION_DECIMALS) for value in (
+            track_data['LAT'].min(), track_data['LON'].min(), track_data['LAT'].max(), track_data['LON'].max())]
+    }
+
+
+# Archive loaded once per worker process.  load_ibtracs returns columns backed by the
+# memory-mapped column cache, so workers share those pages read-only; only the storm
+# index and metrics table, both small, are private to each worker
+_worker_archive = None
+
+
+def _init_worker(data_file, profile):
+    global _worker_archive
+    # Workers only collect events; they go back to the parent with each result
+    if profile:
+        profiling.enable()
+    _worker_archive = load_archive(data_file)
+
+
+def _build_storm_in_worker(job):
+    df, archive_index, metrics = _worker_archive
+    hurricane, sid = job
+    result = build_storm(df, archive_index, hurricane, sid, metrics)
+    return result, profiling.drain()
+
+
+def _build_jobs(jobs, data_file, workers, archive):
+    """Build ``(hurricane, sid)`` jobs serially or in a process pool, in order."""
+    if workers <= 1:
+        df, archive_index, metrics = archive
+        return [build_storm(df, archive_index, hurricane, sid, metrics) for hurricane, sid in jobs]
+    
+    # The parent has loaded ``archive``, so the cache and indexes exist and workers only ever read them
+    initargs = (data_file, profiling.enabled())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        results = []
+        for result, events in executor.map(_build_storm_in_worker, jobs):
+            profiling.merge(events)
+            results.append(result)
+        return results
+
+
+def build_storms(hurricanes, data_file=OUTPUT_FILE, workers=1, archive=None, fragments=None):
+    """Build every storm's result, in the order of ``hurricanes``.
+    
+    With ``workers`` > 1 the storms are built in a process pool; results are still
+    merged in input order, so the page is identical to a serial build.
+    
+    With a :class:`FragmentCache` as ``fragments``, storms whose input rows are
+    unchanged since the last build are read from the cache and only the rest are
+    rebuilt; fragments of storms no longer in ``hurricanes`` are evicted.
+    
+    Every entry is resolved before anything is built, so an entry that matches no
+    storm or several raises (see :func:`find_storm`) instead of being left out.
+    """
+    if archive is None:
+        archive = load_archive(data_file)
+    df, archive_index, _ = archive
+    sids = [find_storm(archive_index, hurricane) for hurricane in hurricanes]
+    if fragments is None:
+        return _build_jobs(list(zip(hurricanes, sids)), data_file, workers, archive)
+    
+    salt = code_digest(FRAGMENT_SOURCES)
+    results = [None] * len(hurricanes)
+    digests = {}
+    stale = []
+    for i, (hurricane, sid) in enumerate(zip(hurricanes, sids)):
+        digests[i] = storm_digest(archive_index.track(df, sid), hurricane, salt)
+        results[i] = fragments.get(digests[i])
+        if results[i] is None:
+            stale.append((i, hurricane, sid))
+        else:
+            print(f"{hurricane['name']} is unchanged since the last build, reusing its cached layer")
+    
+    rebuilt = _build_jobs([(hurricane, sid) for _, hurricane, sid in stale], data_file, workers, archive)
+    for (i, _, _), result in zip(stale, rebuilt):
+        results[i] = result
+        if result is not None:
+            fragments.put(digests[i], result)
+    
+    evicted = fragments.retain(digest for i, digest in digests.items() if results[i] is not None)
+    print(f"Incremental build: {fragments.hits} storms reused, {len(stale)} rebuilt, {evicted} stale fragments evicted")
+    return results
+
+
+def with_analogs(hurricanes, storm, analogs, archive_index):
+    """``hurricanes`` plus ``storm`` and its ``analogs`` entries, without listing any storm twice.
+    
+    ``storm`` is only appended when it is not already listed.  An analog that is
+    already in ``hurricanes`` takes that entry's place, so it keeps its position
+    but is labelled as an analog.
+    """
+    storms = list(hurricanes)
+    positions = {}
+    for i, hurricane in enumerate(storms):
+        sids = [hurricane['sid']] if 'sid' in hurricane else archive_index.lookup(hurricane['name'], hurricane['year'])
+        for sid in sids:
+            positions.setdefault(sid, i)
+    if storm['sid'] not in positions:
+        storms.append(storm)
+    for analog in analogs:
+        if analog['sid'] in positions:
+            storms[positions[analog['sid']]] = analog
+        else:
+            storms.append(analog)
+    return storms
+
+
+def _stable_ids(root):
+    """Replace folium's random element IDs with sequential ones so identical inputs give identical pages."""
+    counter = itertools.count()
+    
+    def visit(element):
+        element._id = f"{next(counter):032x}"
+        children = list(element._children.values())
+        element._children.clear()
+        for child in children:
+            visit(child)
+            element._children[child.get_name()] = child
+    
+    visit(root)
+
+
+def render_map(results, boundary_files=None, animation=None):
+    """Assemble the folium map from the per-storm results, in order.
+
+    Boundary bands are embedded unless ``boundary_files`` names a directory
+    next to the page to write them to.  An ``animation`` payload (see
+    :func:`animation.animation_frames`) adds time-animated playback.
+    """
+    # Create a map centered on the Atlantic
+    hurricane_map = folium.Map(location=[25, -70], zoom_start=4, tiles='CartoDB positron')
+    
+    # Layer builder and tooltip/popup templates shared by every storm
+    hurricane_map.get_root().header.add_child(folium.Element(STORM_LAYER_JS))
+    
+    # Add US state boundaries from the bundled, pre-simplified layer
+    with profiling.stage('boundaries'):
+        add_boundaries(hurricane_map, files_dir=boundary_files)
+    
+    # Skip storms that were not found
+    results = [result for result in results if result is not None]
+    
+    for result in results:
+        StormLayer(result['layer']).add_to(hurricane_map)
+    
+    if animation is not None:
+        add_animation(hurricane_map, animation)
+    
+    # Calculate the bounding box for all hurricanes to set appropriate map view
+    if results:
+        southwest = [min(r['bounds'][0] for r in results), min(r['bounds'][1] for r in results)]
+        northeast = [max(r['bounds'][2] for r in results), max(r['bounds'][3] for r in results)]
+        hurricane_map.fit_bounds([southwest, northeast])
+    
+    hurricane_map.get_root().html.add_child(folium.Element(TITLE_HTML))
+    hurricane_map.get_root().html.add_child(folium.Element(LEGEND_HTML))
+    hurricane_map.get_root().html.add_child(folium.Element(INSTRUCTIONS_HTML))
+    
+    # Create the HTML for the information panel with vertical scrolling
+    info_panel_html = '''
+    <div style="position: fixed; 
+        top: 150px; left: 10px; 
+        z-index:9999; font-size:12px; background-color:white; 
+        padding:10px; border-radius:5px; border:1px solid gray; opacity:0.9;
+        max-height: 35vh; overflow-y: auto; width: 250px;">
+        <div style="font-weight: bold; margin-bottom: 10px; text-align: center; font-size: 14px; position: sticky; top: 0; background-color: white; padding: 5px 0;">Hurricane Summary</div>
+    '''
+
+    # Add each hurricane to the info panel
+    info_panel_html += ''.join(r['panel'] for r in results)
+
+    # Add a note about scrolling
+    info_panel_html += '''
+        <div style="font-style: italic; font-size: 10px; text-align: center; margin-top: 5px;">Scroll to see more hurricanes</div>
     </div>
     '''
 
-# Add a note about scrolling
-info_panel_html += '''
-    <div style="font-style: italic; font-size: 10px; text-align: center; margin-top: 5px;">Scroll to see more hurricanes</div>
-</div>
-'''
+    # Add the info panel to the map
+    hurricane_map.get_root().html.add_child(folium.Element(info_panel_html))
+    
+    _stable_ids(hurricane_map.get_root())
+    return hurricane_map
+
 
-# Add the info panel to the map
-hurricane_map.get_root().html.add_child(folium.Element(info_panel_html))
+def page_html(hurricane_map):
+    """Render the map to the complete HTML page."""
+    folium.GeoJson._get_self_bounds = lambda obj: [[0, 0], [0, 0]]  # Workaround for NumPy serialization issue
+    folium.GeoJsonTooltip._get_self_bounds = lambda obj: [[0, 0], [0, 0]]  # Workaround for NumPy serialization issue
+    
+    # Storm and animation payloads are already JSON text (serialized with NumpyEncoder),
+    # so rendering touches no global state and pages can be built concurrently
+    with profiling.stage('page_html') as counters:
+        html = hurricane_map.get_root().render()
+        counters['bytes'] = len(html)
+    return html
+
+
+def save_map(hurricane_map, output_file=MAP_FILE):
+    """Write the map to ``output_file`` plus pre-compressed copies for static servers."""
+    html = page_html(hurricane_map)
+    with profiling.stage('write'):
+        with open(output_file, 'wb') as f:
+            f.write(html.encode('utf-8'))
+        
+        print(f"Map saved to {output_file}")
+        
+        # Pre-compressed copies for static servers
+        for compressed_file in write_compressed(output_file):
+            print(f"Compressed copy saved to {compressed_file}")
 
-# Save the map to an HTML file
-output_file = 'multiple_hurricane_tracks_final.html'
-# Use our custom NumPy encoder for JSON serialization
-folium.GeoJson._get_self_bounds = lambda obj: [[0, 0], [0, 0]]  # Workaround for NumPy serialization issue
-folium.GeoJsonTooltip._get_self_bounds = lambda obj: [[0, 0], [0, 0]]  # Workaround for NumPy serialization issue
 
-# Override the default JSON encoder with our NumPy-aware encoder
-old_dumps = json.dumps
-json.dumps = lambda obj, *args, **kwargs: old_dumps(obj, *args, cls=NumpyEncoder, **kwargs)
+def build_map(storm_keys, data_file=OUTPUT_FILE, archive=None, layer_cache=None, boundary_files=None,
+              animate=False):
+    """Build the map of ``storm_keys`` and return the page as UTF-8 bytes.
+    
+    ``storm_keys`` are anything :func:`storm_entry` accepts; a key that matches no
+    storm or several raises, as in :func:`find_storm`.  Pass an already loaded
+    ``archive`` (from :func:`load_archive`) to skip loading ``data_file``, and a
+    ``layer_cache`` with ``get(key)`` and ``put(key, value, size)`` (such as the
+    server's LRU cache) to reuse storms built for earlier maps.  With ``animate``
+    the page also replays the storms over time.
+    """
+    if archive is None:
+        archive = load_archive(data_file)
+    df, archive_index, metrics = archive
+    
+    results = []
+    for key in storm_keys:
+        hurricane = storm_entry(key, archive_index)
+        sid = find_storm(archive_index, hurricane)
+        cache_key = ('storm', archive_index.sha256, sid, json.dumps(hurricane, sort_keys=True))
+        result = layer_cache.get(cache_key) if layer_cache is not None else None
+        if result is None:
+            result = build_storm(df, archive_index, hurricane, sid, metrics)
+            if result is not None and layer_cache is not None:
+                layer_cache.put(cache_key, result, len(result['layer']) + len(result['panel']))
+        results.append(result)
+    
+    animation = animation_frames(df, archive_index, [r['sid'] for r in results if r is not None]) if animate else None
+    return page_html(render_map(results, boundary_files, animation)).encode('utf-8')
 
-# Save the map
-hurricane_map.save(output_file)
 
-# Restore the original JSON dumps function
-json.dumps = old_dumps
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render the selected hurricane tracks to an interactive HTML map.')
+    parser.add_argument('--data', default=OUTPUT_FILE, help='extracted IBTrACS CSV file to read')
+    parser.add_argument('--output', default=MAP_FILE, help='HTML file to write')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='build storms in this many processes (0 = one per CPU); the page is identical to a serial build')
+    parser.add_argument('--incremental', action='store_true',
+                        help='reuse cached layers of storms whose input rows are unchanged since the last build')
+    parser.add_argument('--profile', nargs='?', const=profiling.DEFAULT_TRACE_FILE, metavar='TRACE_FILE',
+                        help='record per-stage and per-storm time and memory to a Chrome trace file '
+                             f'(default {profiling.DEFAULT_TRACE_FILE}; also enabled by ${profiling.PROFILE_ENV})')
+    parser.add_argument('--animate', action='store_true',
+                        help='add time-animated playback of the storms on a shared 3-hourly time axis')
+    parser.add_argument('--boundary-files', action='store_true',
+                        help='write boundary bands next to the page (<output>_boundaries/) instead of embedding them')
+    add_selection_arguments(parser)
+    add_analog_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+    profiling.configure(args.profile)
+    
+    # Load the smaller extracted CSV file
+    print("Loading CSV file...")
+    fragments = FragmentCache.for_output(args.output) if args.incremental else None
+    storms, archive = hurricanes, None
+    if has_selection(args):
+        # Storms crossing the requested box, circle or region replace the hurricanes list
+        archive = load_archive(args.data)
+        with profiling.stage('select_storms') as counters:
+            sids = select_storms(SpatialIndex.for_archive(args.data), args.bbox, args.near, args.region,
+                                 args.since, args.until)
+            counters['storms'] = len(sids)
+        print(f"{len(sids)} storms match the geographic selection")
+        storms = [storm_entry(sid, archive[1]) for sid in sids]
+    if args.analogs:
+        # The storm and its closest historical tracks are added to the storms being mapped
+        archive = archive if archive is not None else load_archive(args.data)
+        try:
+            analog_of = storm_entry(args.analogs, archive[1])
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            sid = find_storm(archive[1], analog_of)
+        except LookupError as e:
+            parser.error(f"Cannot find analogs of {args.analogs}: {e.args[0]}")
+        with profiling.stage('find_analogs', sid=sid) as counters:
+            analogs = analog_entries(AnalogIndex.for_archive(args.data), archive[1], sid, args.analog_count,
+                                     args.since, args.until)
+            counters['storms'] = len(analogs)
+        print(f"{len(analogs)} analogs of {analog_of['name']} ({analog_of['year']}): "
+              + ', '.join(f"{a['name']} ({a['year']}, {a['analog_km']:,} km)" for a in analogs))
+        storms = with_analogs(storms, dict(analog_of, sid=sid), analogs, archive[1])
+    with profiling.stage('build_storms', workers=workers):
+        try:
+            results = build_storms(storms, data_file=args.data, workers=workers, archive=archive, fragments=fragments)
+        except LookupError as e:
+            parser.error(e.args[0])
+    
+    animation = None
+    if args.animate:
+        df, archive_index, _ = archive if archive is not None else load_archive(args.data)
+        with profiling.stage('animation_frames') as counters:
+            animation = animation_frames(df, archive_index, [r['sid'] for r in results if r is not None])
+            counters['frames'] = animation['frames']
+            counters['positions'] = len(animation['cat'])
+        print(f"Animation: {animation['frames']} frames of {animation['step']} minutes, "
+              f"{len(animation['cat'])} interpolated positions")
+    
+    boundary_files = f"{os.path.splitext(args.output)[0]}_boundaries" if args.boundary_files else None
+    with profiling.stage('render_map'):
+        hurricane_map = render_map(results, boundary_files, animation)
+    save_map(hurricane_map, args.output)
+    
+    # Print a completion message with instructions
+    print("\nVisualization complete! To view the map:")
+    print(f"1. Open {args.output} in your web browser")
+    print("2. Hover over track segments to see basic information")
+    print("3. Click on any hurricane track or marker for detailed information")
+    print("4. The information panel on the right shows a summary of all hurricanes")
+    
+    profiling.save()
 
-print(f"Map saved to {output_file}")
 
-# Print a completion message with instructions
-print("\nVisualization complete! To view the map:")
-print(f"1. Open {output_file} in your web browser")
-print("2. Hover over track segments to see basic information")
-print("3. Click on any hurricane track or marker for detailed information")
-print("4. The information panel on the right shows a summary of all hurricanes")
+if __name__ == '__main__':
+    main()
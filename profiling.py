@@ -0,0 +1,148 @@
+"""Opt-in stage profiling with Chrome trace output.
+
+Profiling is off unless a script is run with ``--profile [TRACE_FILE]`` or the
+``HURRICANE_PROFILE`` environment variable names a trace file (``1`` picks the
+default name).  While it is off, :func:`stage` is a no-op context manager, so
+the instrumented code pays nothing.
+
+When it is on, every stage records its wall time, CPU time and tracemalloc
+peak, plus any counters the code attaches (layers and serialized bytes per
+storm, rows per chunk, ...).  Stages nest, and a stage's memory peak includes
+the peaks of the stages inside it.  The trace is written in the Chrome trace
+event format, which ``chrome://tracing``, Perfetto and most dashboards load
+directly.  Events recorded in worker processes are shipped back with their
+results and merged into the parent's trace.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+PROFILE_ENV = 'HURRICANE_PROFILE'
+DEFAULT_TRACE_FILE = 'hurricane_profile.json'
+
+_profiler = None
+
+
+class Profiler:
+    """Collects stage events; ``path`` is where :func:`save` writes them (None in workers)."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.events = []
+        # One entry per open stage: the highest traced memory seen by stages nested inside it
+        self._stack = []
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, /, **args):
+        # reset_peak() below forgets the enclosing stage's peak so far, so fold it in first
+        if self._stack:
+            self._stack[-1] = max(self._stack[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._stack.append(0)
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield args
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            peak = max(tracemalloc.get_traced_memory()[1], self._stack.pop())
+            if self._stack:
+                self._stack[-1] = max(self._stack[-1], peak)
+            args.update({
+                'cpu_ms': round(cpu * 1000, 3),
+                'tracemalloc_start_bytes': start_memory,
+                'tracemalloc_peak_bytes': peak,
+            })
+            # perf_counter is system-wide monotonic on Linux, so worker events line up with ours
+            self.events.append({
+                'name': name,
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': round(start_wall * 1e6, 1),
+                'dur': round(wall * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': 0,
+                'args': args,
+            })
+
+
+def enable(path=None):
+    """Start profiling; the trace goes to ``path`` on :func:`save`."""
+    global _profiler
+    _profiler = Profiler(path)
+    return _profiler
+
+
+def configure(path=None):
+    """Enable profiling from a ``--profile`` value or, failing that, the environment; returns whether it is on."""
+    path = path or os.environ.get(PROFILE_ENV)
+    if not path:
+        return False
+    enable(DEFAULT_TRACE_FILE if path == '1' else path)
+    return True
+
+
+def enabled():
+    return _profiler is not None
+
+
+def stage(name, /, **args):
+    """Context manager timing one stage; yields a dict the stage can add counters to."""
+    if _profiler is None:
+        return contextlib.nullcontext(args)
+    return _profiler.stage(name, **args)
+
+
+def drain():
+    """Take the events recorded so far (used to send a worker's events back with its result)."""
+    if _profiler is None:
+        return []
+    events, _profiler.events = _profiler.events, []
+    return events
+
+
+def merge(events):
+    """Add events recorded in another process."""
+    if _profiler is not None:
+        _profiler.events.extend(events)
+
+
+def summary(events):
+    """Per stage name: count, total wall and CPU seconds and the highest tracemalloc peak."""
+    totals = defaultdict(lambda: {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_bytes': 0})
+    for event in events:
+        total = totals[event['name']]
+        total['count'] += 1
+        total['wall_s'] += event['dur'] / 1e6
+        total['cpu_s'] += event['args']['cpu_ms'] / 1000
+        total['peak_bytes'] = max(total['peak_bytes'], event['args']['tracemalloc_peak_bytes'])
+    return dict(totals)
+
+
+def save():
+    """Write the Chrome trace and print a per-stage summary; returns the trace path, or None if profiling is off."""
+    if _profiler is None or _profiler.path is None:
+        return None
+    events = sorted(_profiler.events, key=lambda event: event['ts'])
+    totals = summary(events)
+    trace = {
+        'traceEvents': events,
+        'displayTimeUnit': 'ms',
+        'otherData': {'argv': sys.argv, 'summary': totals},
+    }
+    with open(_profiler.path, 'w') as f:
+        f.write(json.dumps(trace, indent=1))
+
+    print(f"\nProfile ({len(events)} stage events) saved to {_profiler.path}")
+    for name, total in sorted(totals.items(), key=lambda item: -item[1]['wall_s']):
+        print(f"  {name:<20} x{total['count']:<5} {total['wall_s']:>8.3f}s wall {total['cpu_s']:>8.3f}s cpu "
+              f"{total['peak_bytes'] / 2**20:>8.1f} MB peak")
+    return _profiler.path
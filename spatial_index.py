@@ -0,0 +1,370 @@
+"""Grid index of storm track segments for geographic storm selection.
+
+Every pair of consecutive fixes of a storm is a track segment.  The index files
+each segment under the 1-degree grid cells its bounding box touches, in a
+compressed sparse row layout (cell -> segment numbers).  A query looks up the
+cells it covers, gathers their segments as candidates and runs an exact
+vectorized test on just those:
+
+- :meth:`SpatialIndex.select_bbox`: storms with a segment crossing a lon/lat box
+- :meth:`SpatialIndex.select_radius`: storms passing within a great-circle
+  (haversine) distance of a point
+- :meth:`SpatialIndex.select_polygon`: storms crossing a polygon, such as a
+  state outline from the bundled boundary layers (see :func:`region_rings`)
+
+Queries return storm IDs in archive order, ready for
+:func:`multi_hurricane_visualization_final.build_map`.  Segments that cross the
+antimeridian are stored unwrapped (the second endpoint may lie beyond
++-180 degrees) and every exact test works in longitudes relative to the query,
+so boxes, circles and polygons on either side of the dateline behave the same.
+
+Like the storm index, the spatial index is built once per archive, stored
+next to the column cache and rebuilt whenever the cache is.
+
+Usage::
+
+    python spatial_index.py --data ibtracs.ALL.list.v04r01.csv --near 27.95 -82.46 100 --since 1950
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from boundaries import BOUNDARY_DIR, available_layers
+from extract_hurricane_data import OUTPUT_FILE
+from geometry import clip_segments, haversine_km, wrap_longitude
+from ibtracs_cache import CACHE_DIR, cached_artifact
+
+INDEX_FILE = 'spatial_index.npz'
+
+# Grid cell size in degrees; 3-hourly segments rarely span more than one or two cells
+CELL_DEGREES = 1.0
+
+INDEX_COLUMNS = ['SID', 'SEASON', 'ISO_TIME', 'LAT', 'LON']
+
+# Kilometres per degree of latitude on the sphere used by haversine_km
+KM_PER_DEGREE = 111.19508
+
+
+def _ranges(starts, stops):
+    """Concatenation of ``arange(start, stop)`` for every pair, without a Python loop."""
+    counts = stops - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+def _segments_hit_box(x0, y0, x1, y1, xmin, ymin, xmax, ymax):
+    """Which segments touch the box ``[xmin, xmax] x [ymin, ymax]``."""
+    return clip_segments(x0, y0, x1, y1, xmin, ymin, xmax, ymax)[2]
+
+
+def _points_in_rings(x, y, rings):
+    """Even-odd point-in-polygon test of points against all edges of ``rings`` (holes included)."""
+    inside = np.zeros(len(x), dtype=bool)
+    for ring in rings:
+        rx, ry = ring[:, 0], ring[:, 1]
+        for ax, ay, bx, by in zip(rx, ry, np.roll(rx, -1), np.roll(ry, -1)):
+            crosses = (ay > y) != (by > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                at = ax + (y - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (x < at)
+    return inside
+
+
+def _segments_cross_rings(x0, y0, x1, y1, rings):
+    """Which segments properly intersect an edge of ``rings``."""
+    def orientation(ax, ay, bx, by, cx, cy):
+        return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+    crosses = np.zeros(len(x0), dtype=bool)
+    for ring in rings:
+        rx, ry = ring[:, 0], ring[:, 1]
+        for ax, ay, bx, by in zip(rx, ry, np.roll(rx, -1), np.roll(ry, -1)):
+            crosses |= ((orientation(x0, y0, x1, y1, ax, ay) != orientation(x0, y0, x1, y1, bx, by))
+                        & (orientation(ax, ay, bx, by, x0, y0) != orientation(ax, ay, bx, by, x1, y1)))
+    return crosses
+
+
+class SpatialIndex:
+    """Track segments of every storm in an archive, bucketed by grid cell."""
+
+    def __init__(self, sids, seasons, segment_storms, segments, cell_offsets, cell_segments,
+                 cell_degrees=CELL_DEGREES, rows=0, sha256=None):
+        # sids[i], seasons[i]: storm i in archive order (season NaN when unknown)
+        self.sids = sids
+        self.seasons = seasons
+        # segment_storms[j]: storm of segment j; segments[j]: lon0, lat0, lon1, lat1 (lon1 unwrapped)
+        self.segment_storms = segment_storms
+        self.segments = segments
+        # Segments of cell c are cell_segments[cell_offsets[c]:cell_offsets[c + 1]]
+        self.cell_offsets = cell_offsets
+        self.cell_segments = cell_segments
+        self.cell_degrees = cell_degrees
+        self.grid_columns = int(round(360 / cell_degrees))
+        self.grid_rows = int(round(180 / cell_degrees))
+        self.rows = rows
+        self.sha256 = sha256
+
+    @classmethod
+    def build(cls, df, sha256=None, cell_degrees=CELL_DEGREES):
+        """Build the index from a frame with SID, SEASON, ISO_TIME, LAT and LON columns."""
+        codes, sids = pd.factorize(df['SID'].to_numpy())
+        seasons_by_row = df['SEASON'].to_numpy(dtype=float, na_value=np.nan)
+        first_rows = np.unique(codes[codes >= 0], return_index=True)[1]
+        seasons = seasons_by_row[codes >= 0][first_rows]
+
+        lat = df['LAT'].to_numpy(dtype=float, na_value=np.nan)
+        lon = df['LON'].to_numpy(dtype=float, na_value=np.nan)
+        times = df['ISO_TIME'].to_numpy(dtype='datetime64[ns]')
+        valid = np.flatnonzero((codes >= 0) & ~np.isnan(lat) & ~np.isnan(lon) & ~np.isnat(times))
+        # Each storm's fixes in time order
+        order = valid[np.lexsort((times[valid], codes[valid]))]
+        codes, lat, lon = codes[order], lat[order], lon[order]
+
+        # A segment joins consecutive fixes of one storm; a storm with a single fix gets a point segment
+        same = codes[1:] == codes[:-1]
+        single = np.ones(len(codes), dtype=bool)
+        single[1:] &= ~same
+        single[:-1] &= ~same
+        starts = np.sort(np.r_[np.flatnonzero(same), np.flatnonzero(single)])
+        ends = np.where(single[starts], starts, starts + 1)
+        lon1 = lon[starts] + wrap_longitude(lon[ends] - lon[starts])
+        segments = np.column_stack([lon[starts], lat[starts], lon1, lat[ends]]).astype('float32')
+        segment_storms = codes[starts].astype('int32')
+
+        index = cls(np.asarray(sids, dtype=str), seasons, segment_storms, segments,
+                    None, None, cell_degrees, len(df), sha256)
+        index.cell_offsets, index.cell_segments = index._bucket(segments)
+        return index
+
+    def _cells(self, min_lon, min_lat, max_lon, max_lat):
+        """Column and row ranges of the grid cells covering lon/lat boxes, element-wise."""
+        first_column = np.floor((min_lon + 180.0) / self.cell_degrees).astype(np.int64)
+        last_column = np.floor((max_lon + 180.0) / self.cell_degrees).astype(np.int64)
+        # A box wider than the world covers every column once
+        last_column = np.minimum(last_column, first_column + self.grid_columns - 1)
+        first_row = np.clip(np.floor((min_lat + 90.0) / self.cell_degrees), 0, self.grid_rows - 1).astype(np.int64)
+        last_row = np.clip(np.floor((max_lat + 90.0) / self.cell_degrees), 0, self.grid_rows - 1).astype(np.int64)
+        return first_column, last_column, first_row, last_row
+
+    def _bucket(self, segments):
+        """CSR cell offsets and segment numbers for ``segments``."""
+        lon0, lat0, lon1, lat1 = segments.T.astype(float)
+        first_column, last_column, first_row, last_row = self._cells(
+            np.minimum(lon0, lon1), np.minimum(lat0, lat1), np.maximum(lon0, lon1), np.maximum(lat0, lat1))
+        widths = last_column - first_column + 1
+        counts = widths * (last_row - first_row + 1)
+        segment = np.repeat(np.arange(len(segments)), counts)
+        # Position of each (segment, cell) pair within its segment's block of cells
+        within = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+        column = (first_column[segment] + within % widths[segment]) % self.grid_columns
+        row = first_row[segment] + within // widths[segment]
+        cell = row * self.grid_columns + column
+
+        order = np.argsort(cell, kind='stable')
+        offsets = np.searchsorted(cell[order], np.arange(self.grid_columns * self.grid_rows + 1))
+        return offsets.astype('int64'), segment[order].astype('int32')
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(data['sids'], data['seasons'], data['segment_storms'], data['segments'],
+                       data['cell_offsets'], data['cell_segments'], meta['cell_degrees'], meta['rows'], meta['sha256'])
+
+    def save(self, path):
+        meta = {'cell_degrees': self.cell_degrees, 'rows': self.rows, 'sha256': self.sha256}
+        tmp = str(path) + '.tmp.npz'
+        np.savez(tmp, meta=np.array(json.dumps(meta)), sids=self.sids, seasons=self.seasons,
+                 segment_storms=self.segment_storms, segments=self.segments,
+                 cell_offsets=self.cell_offsets, cell_segments=self.cell_segments)
+        os.replace(tmp, path)
+
+    @classmethod
+    def for_archive(cls, source, cache_dir=CACHE_DIR):
+        """The spatial index of ``source``, kept with its column cache like the storm index."""
+        return cached_artifact(source, INDEX_FILE, INDEX_COLUMNS, cls.build, cls.load, cache_dir=cache_dir)
+
+    def __len__(self):
+        return len(self.sids)
+
+    def _candidates(self, min_lon, min_lat, max_lon, max_lat):
+        """Segments filed under any cell of the box; ``max_lon`` may exceed 180 for boxes across the dateline."""
+        first_column, last_column, first_row, last_row = self._cells(min_lon, min_lat, max_lon, max_lat)
+        columns = np.arange(first_column, last_column + 1) % self.grid_columns
+        rows = np.arange(first_row, last_row + 1)
+        cells = (rows[:, None] * self.grid_columns + columns[None, :]).ravel()
+        # A segment spanning several cells is listed once per cell; a mask dedupes faster than sorting
+        candidates = np.zeros(len(self.segments), dtype=bool)
+        candidates[self.cell_segments[_ranges(self.cell_offsets[cells], self.cell_offsets[cells + 1])]] = True
+        return np.flatnonzero(candidates)
+
+    def _relative_segments(self, segments, center_lon):
+        """Candidate segments as float64 with longitudes relative to ``center_lon``."""
+        lon0, lat0, lon1, lat1 = self.segments[segments].T.astype(float)
+        x0 = wrap_longitude(lon0 - center_lon)
+        return x0, lat0, x0 + (lon1 - lon0), lat1
+
+    def _storms(self, segments, hits, since=None, until=None):
+        """SIDs of the storms owning the hit segments, in archive order, filtered by season."""
+        matched = np.zeros(len(self.sids), dtype=bool)
+        matched[self.segment_storms[segments[hits]]] = True
+        storms = np.flatnonzero(matched)
+        seasons = self.seasons[storms]
+        keep = np.ones(len(storms), dtype=bool)
+        if since is not None:
+            keep &= seasons >= since
+        if until is not None:
+            keep &= seasons <= until
+        return [str(sid) for sid in self.sids[storms[keep]]]
+
+    def select_bbox(self, min_lon, min_lat, max_lon, max_lat, since=None, until=None):
+        """SIDs of storms with a segment inside or crossing the box.
+
+        A box with ``min_lon > max_lon`` crosses the antimeridian (e.g. 170 to -170).
+        """
+        width = max_lon - min_lon if max_lon >= min_lon else max_lon - min_lon + 360.0
+        center = min_lon + width / 2
+        segments = self._candidates(min_lon, min_lat, min_lon + width, max_lat)
+        x0, y0, x1, y1 = self._relative_segments(segments, center)
+        # Most candidates of a large box start inside it; clip only the rest
+        hits = (np.abs(x0) <= width / 2) & (y0 >= min_lat) & (y0 <= max_lat)
+        rest = ~hits
+        hits[rest] = _segments_hit_box(x0[rest], y0[rest], x1[rest], y1[rest], -width / 2, min_lat, width / 2, max_lat)
+        return self._storms(segments, hits, since, until)
+
+    def select_radius(self, lat, lon, radius_km, since=None, until=None):
+        """SIDs of storms passing within ``radius_km`` (great-circle) of ``lat``, ``lon``.
+
+        The closest point of each candidate segment is found in a local
+        equirectangular projection around the query point and its distance is
+        then measured with the haversine formula.
+        """
+        radius_deg = radius_km / KM_PER_DEGREE
+        min_lat, max_lat = max(lat - radius_deg, -90.0), min(lat + radius_deg, 90.0)
+        widest = max(abs(min_lat), abs(max_lat))
+        if widest >= 89.9:
+            lon_deg = 180.0
+        else:
+            lon_deg = min(radius_deg / np.cos(np.radians(widest)), 180.0)
+        segments = self._candidates(lon - lon_deg, min_lat, lon + lon_deg, max_lat)
+
+        x0, y0, x1, y1 = self._relative_segments(segments, lon)
+        scale = np.cos(np.radians(lat))
+        dx, dy = (x1 - x0) * scale, y1 - y0
+        length2 = dx * dx + dy * dy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(length2 > 0, (-x0 * scale * dx + (lat - y0) * dy) / length2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        distance = haversine_km(0.0, lat, x0 + t * (x1 - x0), y0 + t * (y1 - y0))
+        return self._storms(segments, distance <= radius_km, since, until)
+
+    def select_polygon(self, rings, since=None, until=None):
+        """SIDs of storms with a segment inside or crossing the polygon.
+
+        ``rings`` is a list of ``[[lon, lat], ...]`` rings (outer rings and
+        holes alike, combined with the even-odd rule), as in GeoJSON Polygon and
+        MultiPolygon coordinates.
+        """
+        rings = [np.asarray(ring, dtype=float) for ring in rings]
+        center = float(rings[0][0, 0])
+        rings = [np.column_stack([wrap_longitude(ring[:, 0] - center), ring[:, 1]]) for ring in rings]
+        points = np.concatenate(rings)
+        min_x, min_y = points.min(axis=0)
+        max_x, max_y = points.max(axis=0)
+
+        segments = self._candidates(center + min_x, min_y, center + max_x, max_y)
+        x0, y0, x1, y1 = self._relative_segments(segments, center)
+        # Cheap box test first, then the exact polygon test on what is left
+        near = _segments_hit_box(x0, y0, x1, y1, min_x, min_y, max_x, max_y)
+        hits = np.zeros(len(segments), dtype=bool)
+        x0, y0, x1, y1 = x0[near], y0[near], x1[near], y1[near]
+        hits[near] = (_points_in_rings(x0, y0, rings) | _points_in_rings(x1, y1, rings)
+                      | _segments_cross_rings(x0, y0, x1, y1, rings))
+        return self._storms(segments, hits, since, until)
+
+
+def region_rings(name):
+    """Polygon rings of the bundled boundary feature called ``name`` (e.g. ``'Florida'``)."""
+    for layer in available_layers().values():
+        with open(BOUNDARY_DIR / layer['file']) as f:
+            collection = json.load(f)
+        for feature in collection['features']:
+            if str(feature['properties'].get('name', '')).lower() != name.lower():
+                continue
+            geometry = feature['geometry']
+            if geometry['type'] == 'Polygon':
+                return geometry['coordinates']
+            if geometry['type'] == 'MultiPolygon':
+                return [ring for polygon in geometry['coordinates'] for ring in polygon]
+    raise ValueError(f"No bundled boundary region named {name!r}")
+
+
+def select_storms(spatial_index, bbox=None, near=None, region=None, since=None, until=None):
+    """SIDs matching every given criterion, in archive order.
+
+    ``bbox`` is ``(min_lon, min_lat, max_lon, max_lat)``, ``near`` is
+    ``(lat, lon, radius_km)`` and ``region`` names a bundled boundary feature.
+    """
+    selections = []
+    if bbox is not None:
+        selections.append(spatial_index.select_bbox(*bbox, since=since, until=until))
+    if near is not None:
+        selections.append(spatial_index.select_radius(*near, since=since, until=until))
+    if region is not None:
+        selections.append(spatial_index.select_polygon(region_rings(region), since=since, until=until))
+    if not selections:
+        raise ValueError("Give at least one of bbox, near or region")
+    common = set.intersection(*(set(sids) for sids in selections))
+    return [sid for sid in selections[0] if sid in common]
+
+
+def add_selection_arguments(parser):
+    """Add the ``--bbox``, ``--near``, ``--region``, ``--since`` and ``--until`` options to ``parser``."""
+    group = parser.add_argument_group('geographic selection (combined criteria must all match)')
+    group.add_argument('--bbox', type=float, nargs=4, metavar=('MIN_LON', 'MIN_LAT', 'MAX_LON', 'MAX_LAT'),
+                       help='storms crossing this box (MIN_LON > MAX_LON crosses the dateline)')
+    group.add_argument('--near', type=float, nargs=3, metavar=('LAT', 'LON', 'KM'),
+                       help='storms passing within KM kilometres of a point')
+    group.add_argument('--region', help='storms crossing a bundled boundary region, e.g. Florida')
+    group.add_argument('--since', type=int, help='first season to include')
+    group.add_argument('--until', type=int, help='last season to include')
+
+
+def has_selection(args):
+    """Whether parsed arguments ask for a geographic selection."""
+    return args.bbox is not None or args.near is not None or args.region is not None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the storms crossing a box, circle or region.')
+    parser.add_argument('--data', default=OUTPUT_FILE, help='IBTrACS or extracted CSV file to search')
+    add_selection_arguments(parser)
+    args = parser.parse_args(argv)
+    if not has_selection(args):
+        parser.error('give --bbox, --near and/or --region')
+
+    from storm_index import StormIndex
+
+    start = time.perf_counter()
+    spatial_index = SpatialIndex.for_archive(args.data)
+    storm_index = StormIndex.for_archive(args.data)
+    print(f"Index of {len(spatial_index)} storms ready in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    sids = select_storms(spatial_index, args.bbox, args.near, args.region, args.since, args.until)
+    elapsed = (time.perf_counter() - start) * 1000
+    for sid in sids:
+        name, season = storm_index.storms[sid]
+        print(f"{sid}  {name} ({season})")
+    print(f"{len(sids)} storms matched in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
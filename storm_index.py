@@ -0,0 +1,168 @@
+"""Persistent index of the storms in an IBTrACS archive.
+
+The index maps every storm ID (SID) to the row ranges it occupies in the
+archive, and every (normalized name, season) pair to the SIDs carrying that
+name.  It is built once per archive, stored next to the archive's column cache
+and rebuilt whenever the cache is, so fetching a storm's track is a dictionary
+lookup plus a slice rather than a scan over every row.
+
+Names are not unique: IBTrACS labels every unnamed system ``NOT_NAMED`` and
+names can repeat within a season across basins.  Lookups therefore return a
+list of SIDs, and :meth:`StormIndex.resolve` refuses to guess when there is
+more than one, asking for an explicit SID instead.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ibtracs_cache import CACHE_DIR, cached_artifact
+
+INDEX_FILE = 'storm_index.json'
+
+# Names IBTrACS uses for systems that never received a name
+UNNAMED_NAMES = {'', 'NAN', 'NOT_NAMED', 'NOT NAMED', 'UNNAMED'}
+
+
+class AmbiguousStormError(LookupError):
+    """Raised when a (name, season) pair matches more than one storm."""
+
+    def __init__(self, name, season, sids):
+        self.name = name
+        self.season = season
+        self.sids = sids
+        super().__init__(f"{len(sids)} storms match {name} ({season}): {', '.join(sids)}; "
+                         f"pass a 'sid' to choose one")
+
+
+def normalize_name(name):
+    """Upper-case and strip a storm name, folding every unnamed marker into 'UNNAMED'."""
+    if name is None or (not isinstance(name, str) and pd.isna(name)):
+        return 'UNNAMED'
+    name = str(name).strip().upper()
+    return 'UNNAMED' if name in UNNAMED_NAMES else name
+
+
+class StormIndex:
+    """SID -> row ranges and (name, season) -> SIDs for one archive."""
+
+    def __init__(self, runs, storms, rows, sha256=None):
+        # runs: {sid: [(start, stop), ...]} positional row ranges, stop exclusive
+        self.runs = runs
+        # storms: {sid: (name, season)}
+        self.storms = storms
+        self.rows = rows
+        self.sha256 = sha256
+        self.by_name = {}
+        for sid, (name, season) in storms.items():
+            self.by_name.setdefault((name, season), []).append(sid)
+
+    @classmethod
+    def build(cls, df, sha256=None):
+        """Build the index from a frame with SID, NAME and SEASON columns in archive row order."""
+        codes, sids = pd.factorize(df['SID'].to_numpy())
+        if len(codes) == 0:
+            return cls({}, {}, 0, sha256)
+
+        # Each run is a maximal block of consecutive rows sharing one SID
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        stops = np.r_[starts[1:], len(codes)]
+        run_codes = codes[starts]
+        names = df['NAME'].to_numpy()[starts]
+        seasons = pd.to_numeric(pd.Series(df['SEASON'].to_numpy()[starts]), errors='coerce').to_numpy()
+
+        runs = {}
+        storms = {}
+        for code, start, stop, name, season in zip(run_codes, starts, stops, names, seasons):
+            if code < 0:
+                continue
+            sid = str(sids[code])
+            runs.setdefault(sid, []).append((int(start), int(stop)))
+            if sid not in storms:
+                storms[sid] = (normalize_name(name), None if pd.isna(season) else int(season))
+        return cls(runs, storms, len(codes), sha256)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        runs = {sid: [tuple(run) for run in ranges] for sid, ranges in data['runs'].items()}
+        storms = {sid: (name, season) for sid, (name, season) in data['storms'].items()}
+        return cls(runs, storms, data['rows'], data.get('sha256'))
+
+    def save(self, path):
+        data = {
+            'sha256': self.sha256,
+            'rows': self.rows,
+            'runs': self.runs,
+            'storms': self.storms,
+        }
+        tmp = str(path) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def for_archive(cls, source, cache_dir=CACHE_DIR):
+        """Load the index stored with ``source``'s column cache, building it if it is missing or stale."""
+        return cached_artifact(source, INDEX_FILE, ['SID', 'NAME', 'SEASON'], cls.build, cls.load, cache_dir=cache_dir)
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __contains__(self, sid):
+        return sid in self.runs
+
+    def lookup(self, name, season):
+        """SIDs of the storms called ``name`` in ``season`` (exact, case-insensitive)."""
+        return list(self.by_name.get((normalize_name(name), int(season)), []))
+
+    def search(self, fragment, season):
+        """SIDs in ``season`` whose name contains ``fragment`` (case-insensitive)."""
+        fragment = normalize_name(fragment)
+        season = int(season)
+        return [sid for (name, year), sids in self.by_name.items()
+                if year == season and fragment in name for sid in sids]
+
+    def resolve(self, name, season):
+        """The single SID called ``name`` in ``season``, or else whose name contains ``name``.
+
+        Raises KeyError when no storm matches and AmbiguousStormError when several do.
+        """
+        sids = self.lookup(name, season) or self.search(name, season)
+        if not sids:
+            raise KeyError(f"No storm named {name} in {season}")
+        if len(sids) > 1:
+            raise AmbiguousStormError(normalize_name(name), int(season), sids)
+        return sids[0]
+
+    def row_positions(self, sid):
+        """Positional row numbers of ``sid`` in archive order."""
+        return np.concatenate([np.arange(start, stop) for start, stop in self.runs[sid]])
+
+    def track(self, df, sid):
+        """Rows of ``df`` (the archive frame this index was built from) that belong to ``sid``."""
+        ranges = self.runs[sid]
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return df.iloc[start:stop]
+        return df.iloc[self.row_positions(sid)]
+
+
+def storm_entry(key, archive_index):
+    """Turn a storm key into an entry like those in the visualization's ``hurricanes`` list.
+
+    ``key`` may already be such an entry, a storm ID from the archive, or a
+    name and season as ``'NAME|YEAR'`` or ``'NAME YEAR'``.
+    """
+    if isinstance(key, dict):
+        return key
+    key = str(key).strip()
+    if key in archive_index:
+        name, season = archive_index.storms[key]
+        return {'name': name, 'year': season, 'sid': key}
+    name, _, year = key.replace('|', ' ').rpartition(' ')
+    if not name.strip() or not year.isdigit():
+        raise ValueError(f"Not a storm ID or NAME|YEAR key: {key!r}")
+    return {'name': name.strip().upper(), 'year': int(year)}
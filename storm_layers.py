@@ -0,0 +1,259 @@
+"""Vectorized building blocks for the per-storm map layers.
+
+Per-point fields (category, color, labels) are computed with column operations
+over a whole track at once, and consecutive segments of the same Saffir-Simpson
+category are merged into one run.  A storm's intensity-colored track is then a
+single GeoJSON FeatureCollection with one feature per run, so the number of
+Leaflet layers no longer grows with the number of observations.
+
+Each storm is shipped to the page once, as a compact payload: the track's
+coordinates encoded by :mod:`track_encoding`, the per-point time, wind and
+category arrays, the intensity runs as point index ranges and the marker
+indices.  The shared JavaScript in :data:`STORM_LAYER_JS` decodes the payload,
+draws the layers and builds tooltip and popup HTML from it when the user
+hovers or clicks, so no coordinates or popup HTML are repeated per segment.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from jinja2 import Template
+from jinja2.utils import htmlsafe_json_dumps
+
+from track_encoding import DECODE_COORDINATES_JS, encode_coordinates
+
+# Define colors for hurricane categories
+cat_colors = {
+    -3: 'gray',     # Not designated
+    -2: 'gray',     # Not designated
+    -1: 'blue',     # Tropical Depression
+    0: 'green',     # Tropical Storm
+    1: 'yellow',    # Category 1
+    2: 'orange',    # Category 2
+    3: 'red',       # Category 3
+    4: 'purple',    # Category 4
+    5: 'darkred'    # Category 5
+}
+
+
+# Fix for NumPy int64 JSON serialization issue; payloads are serialized with it explicitly
+class NumpyEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super(NumpyEncoder, self).default(obj)
+
+
+def track_points(track_data):
+    """Per-point display fields for one storm's time-sorted track.
+
+    ``track_data`` needs LAT, LON, USA_SSHS, USA_WIND and ISO_TIME columns, typed
+    as :func:`ibtracs_cache.load_ibtracs` returns them.  The result has one row
+    per observation with lat, lon, category (missing -> -3), color, wind
+    (missing -> NaN), date and minutes (since the first point) columns.
+    """
+    category = track_data['USA_SSHS'].fillna(-3).to_numpy(dtype=int)
+    wind = track_data['USA_WIND'].to_numpy(dtype=float, na_value=np.nan)
+    times = track_data['ISO_TIME']
+    minutes = ((times - times.iloc[0]) // pd.Timedelta(minutes=1)).to_numpy(dtype='int64') if len(times) else []
+
+    return pd.DataFrame({
+        'lat': track_data['LAT'].to_numpy(dtype=float),
+        'lon': track_data['LON'].to_numpy(dtype=float),
+        'category': category,
+        'color': pd.Series(category).map(cat_colors).fillna('gray').to_numpy(),
+        'wind': wind,
+        'date': times.dt.strftime('%Y-%m-%d %H:%M').to_numpy(),
+        'minutes': minutes,
+    })
+
+
+def intensity_runs(category):
+    """``(start, stop)`` point ranges of consecutive segments that share a category.
+
+    Segment ``i`` joins points ``i`` and ``i + 1`` and takes the category of point
+    ``i``; a run covering segments ``start..stop - 1`` is drawn through points
+    ``start..stop`` inclusive, so neighbouring runs share an endpoint.
+    """
+    category = np.asarray(category)
+    if len(category) < 2:
+        return np.empty((0, 2), dtype=int)
+    segment_category = category[:-1]
+    starts = np.flatnonzero(np.r_[True, segment_category[1:] != segment_category[:-1]])
+    stops = np.r_[starts[1:], len(segment_category)]
+    return np.column_stack([starts, stops])
+
+
+def _json_numbers(values):
+    """Float array -> JSON-ready list, with whole numbers as ints and NaN as null."""
+    return [None if np.isnan(v) else int(v) if v == int(v) else float(v) for v in values]
+
+
+def storm_payload(points, sid, summary, markers):
+    """Everything the page needs to draw and describe one storm, with each track stored once.
+
+    ``summary`` holds the storm-level fields (name, year, peak, active,
+    max_wind, description, and for historical analogs analog_of and analog_km)
+    shown in the storm popup and ``markers`` lists the
+    labelled positions as ``[(index, label), ...]``.  Per-point data are
+    ``coords`` (see :func:`track_encoding.encode_coordinates`), ``t0`` (first
+    time), ``minutes`` (offsets from ``t0``), ``wind`` and ``cat``; ``runs``
+    holds ``[start, stop, color]`` point ranges from :func:`intensity_runs`.
+    """
+    category = points['category'].to_numpy()
+    payload = dict(summary)
+    payload.update({
+        'sid': sid,
+        'coords': encode_coordinates(points['lon'].to_numpy(), points['lat'].to_numpy()),
+        't0': points['date'].iat[0],
+        'minutes': points['minutes'].tolist(),
+        'wind': _json_numbers(points['wind'].to_numpy()),
+        'cat': category.tolist(),
+        'runs': [[int(start), int(stop), cat_colors.get(int(category[start]), 'gray')]
+                 for start, stop in intensity_runs(category)],
+        'markers': [[int(idx), label, points['color'].iat[idx]] for idx, label in markers],
+    })
+    return payload
+
+
+def layer_count(payload):
+    """Leaflet layers the page creates for ``payload``: its group, the track, one per run and one per marker."""
+    return 2 + len(payload['runs']) + len(payload['markers'])
+
+
+def serialize_payload(payload):
+    """The payload as the JSON text embedded in the page (what jinja's ``tojson`` would emit)."""
+    return str(htmlsafe_json_dumps(payload, cls=NumpyEncoder, sort_keys=True))
+
+
+class StormLayer(MacroElement):
+    """One storm's track, intensity runs and markers, drawn in the page from its payload.
+
+    ``payload_json`` is the payload already serialized by :func:`serialize_payload`,
+    so a cached storm is added to the page without being encoded again.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = hurricaneTemplates.addStorm(
+            {{ this._parent.get_name() }}, {{ this.payload_json }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, payload_json):
+        super().__init__()
+        self._name = 'StormLayer'
+        self.payload_json = payload_json
+
+
+# Shared layer builder and tooltip/popup templates, added to the page header once
+STORM_LAYER_JS = """
+<script>
+""" + DECODE_COORDINATES_JS + """
+var hurricaneStorms = {};
+var hurricaneTemplates = {
+    categoryLabel: function(c) {
+        return c >= 0 ? String(c) : c >= -1 ? 'TD/TS' : 'Not designated';
+    },
+    point: function(storm, i) {
+        var t = new Date(Date.parse(storm.t0.replace(' ', 'T') + 'Z') + storm.minutes[i] * 60000);
+        var ll = storm.latlngs[i];
+        return {
+            date: t.toISOString().slice(0, 16).replace('T', ' '),
+            wind: storm.wind[i] === null ? 'N/A' : storm.wind[i],
+            category: hurricaneTemplates.categoryLabel(storm.cat[i]),
+            lat: ll[0].toFixed(2),
+            lon: ll[1].toFixed(2)
+        };
+    },
+    // Index (within the layer) of the segment closest to the mouse, i.e. of its first point
+    nearestSegment: function(layer, latlng) {
+        var map = layer._map, latlngs = layer.getLatLngs();
+        if (!map || latlngs.length < 2) { return 0; }
+        var p = map.latLngToLayerPoint(latlng), best = 0, bestDistance = Infinity;
+        for (var j = 0; j < latlngs.length - 1; j++) {
+            var d = L.LineUtil.pointToSegmentDistance(
+                p, map.latLngToLayerPoint(latlngs[j]), map.latLngToLayerPoint(latlngs[j + 1]));
+            if (d < bestDistance) { bestDistance = d; best = j; }
+        }
+        return best;
+    },
+    pointTooltip: function(storm, i) {
+        var pt = hurricaneTemplates.point(storm, i);
+        return storm.name + ' | ' + pt.date + ' | Wind: ' + pt.wind + ' kt | Lat: ' + pt.lat + ', Lon: ' + pt.lon;
+    },
+    pointPopup: function(storm, i, title) {
+        var pt = hurricaneTemplates.point(storm, i);
+        return '<div style="width:250px;">' +
+            '<h4>' + storm.name + ' (' + storm.year + ')' + (title ? ' - ' + title : '') + '</h4>' +
+            '<p><strong>Date:</strong> ' + pt.date + '</p>' +
+            '<p><strong>Location:</strong> ' + pt.lat + '°, ' + pt.lon + '°</p>' +
+            '<p><strong>Wind Speed:</strong> ' + pt.wind + ' kt</p>' +
+            '<p><strong>Category:</strong> ' + pt.category + '</p>' +
+            '</div>';
+    },
+    stormPopup: function(storm) {
+        return '<div style="width:300px; max-height:300px; overflow-y:auto;">' +
+            '<h3>' + storm.name + ' (' + storm.year + ')</h3>' +
+            '<p><strong>Peak Intensity:</strong> ' + storm.peak + '</p>' +
+            '<p><strong>Active:</strong> ' + storm.active + '</p>' +
+            '<p><strong>Maximum Wind Speed:</strong> ' + storm.max_wind + ' kt</p>' +
+            (storm.analog_of ? '<p><strong>Analog of:</strong> ' + storm.analog_of + ' (' +
+                storm.analog_km.toLocaleString('en-US') + ' km mean track distance)</p>' : '') +
+            '<p><strong>Description:</strong></p>' +
+            '<p>' + storm.description + '</p>' +
+            '</div>';
+    },
+    // Decode one storm payload and add its track, intensity runs and markers to the map
+    addStorm: function(map, storm) {
+        storm.latlngs = hurricaneDecodeCoordinates(storm.coords);
+        hurricaneStorms[storm.sid] = storm;
+        var group = L.featureGroup();
+        storm.group = group;
+        // Historical analogs of another storm are drawn dashed
+        var dash = storm.analog_of ? '8 8' : null;
+
+        // A black line for the entire track with the storm summary popup
+        L.polyline(storm.latlngs, {color: 'black', weight: 5, opacity: 0.6, dashArray: dash})
+            .bindTooltip('Click for details on ' + storm.name + ' (' + storm.year + ')' +
+                (storm.analog_of ? ', an analog of ' + storm.analog_of : ''), {sticky: true})
+            .bindPopup(function() { return hurricaneTemplates.stormPopup(storm); }, {maxWidth: 350})
+            .addTo(group);
+
+        // Colored runs of equal intensity with per-point tooltips and popups
+        storm.runs.forEach(function(run) {
+            var first = run[0];
+            var line = L.polyline(storm.latlngs.slice(run[0], run[1] + 1), {color: run[2], weight: 5, opacity: 0.8, dashArray: dash});
+            line.bindTooltip('', {sticky: true});
+            line.on('mousemove', function(e) {
+                line.setTooltipContent(hurricaneTemplates.pointTooltip(storm, first + hurricaneTemplates.nearestSegment(line, e.latlng)));
+            });
+            line.on('click', function(e) {
+                L.popup({maxWidth: 300})
+                    .setLatLng(e.latlng)
+                    .setContent(hurricaneTemplates.pointPopup(storm, first + hurricaneTemplates.nearestSegment(line, e.latlng)))
+                    .openOn(map);
+            });
+            line.addTo(group);
+        });
+
+        // Markers for the labelled points (start, middle, end)
+        storm.markers.forEach(function(marker) {
+            L.circleMarker(storm.latlngs[marker[0]], {
+                radius: 8, color: 'black', weight: 1, fill: true, fillColor: marker[2], fillOpacity: 0.9
+            })
+                .bindTooltip(storm.name + ' (' + storm.year + ') - ' + marker[1])
+                .bindPopup(function() { return hurricaneTemplates.pointPopup(storm, marker[0], marker[1] + ' Point'); }, {maxWidth: 300})
+                .addTo(group);
+        });
+
+        return group.addTo(map);
+    }
+};
+</script>
+"""
@@ -0,0 +1,318 @@
+"""Per-storm climatology metrics for a whole archive, computed in one vectorized pass.
+
+The archive's fixes are sorted once by storm and time, after which every
+metric is a grouped reduction over contiguous blocks of rows (``reduceat``,
+``bincount``) rather than a Python loop per storm:
+
+- ``peak_wind`` (kt), ``min_pressure`` (hPa) and ``peak_sshs`` from the USA
+  agency columns
+- ``ace``: accumulated cyclone energy, the sum of ``wind**2 / 10**4`` over the
+  synoptic fixes (00, 06, 12 and 18 UTC) at which the system was tropical or
+  subtropical with winds of at least 35 kt
+- ``ri_episodes`` and ``max_24h_intensification``: rapid intensification is a
+  rise of at least 30 kt between a fix and the fix exactly 24 hours later;
+  consecutive such fixes form one episode
+- ``track_km``, ``mean_speed_kt`` and ``max_speed_kt``: forward motion between
+  consecutive fixes, from great-circle distances
+- ``landfalls`` and ``land_hours``: moves from over water to over land
+  (``DIST2LAND`` of 0) and the time spent over land
+
+The table is keyed by SID, cached next to the archive's column cache and
+rebuilt with it.  :func:`season_summary` and :func:`archive_summary` aggregate
+it with pandas group-bys, and :func:`describe` turns one row into the text
+shown in a storm's popup.
+
+Usage::
+
+    python storm_metrics.py --data ibtracs.ALL.list.v04r01.csv --season 2024
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from extract_hurricane_data import OUTPUT_FILE
+from geometry import haversine_km
+from ibtracs_cache import CACHE_DIR, cached_artifact
+from storm_index import UNNAMED_NAMES
+
+METRICS_FILE = 'storm_metrics.npz'
+
+# Columns the metrics are computed from; NATURE, USA_PRES and DIST2LAND are optional
+METRIC_COLUMNS = ['SID', 'SEASON', 'NAME', 'ISO_TIME', 'LAT', 'LON', 'NATURE',
+                  'USA_WIND', 'USA_PRES', 'USA_SSHS', 'DIST2LAND']
+
+# ACE counts synoptic fixes of tropical (TS) or subtropical (SS) systems at or above this wind (kt)
+ACE_MIN_WIND = 35
+ACE_NATURES = ['TS', 'SS']
+SYNOPTIC_MINUTES = 6 * 60
+
+# Rapid intensification: at least this many kt gained over this many minutes
+RI_THRESHOLD = 30
+RI_WINDOW_MINUTES = 24 * 60
+
+KM_PER_NAUTICAL_MILE = 1.852
+
+# Columns of the metrics table, in order
+COLUMNS = ['name', 'season', 'start', 'end', 'fixes', 'duration_hours', 'peak_wind', 'min_pressure',
+           'peak_sshs', 'ace', 'ri_episodes', 'max_24h_intensification', 'track_km', 'mean_speed_kt',
+           'max_speed_kt', 'landfalls', 'land_hours']
+
+
+def _float_column(df, name, order):
+    """Column ``name`` as floats (NaN where missing) in ``order``, or all NaN if the frame lacks it."""
+    if name not in df:
+        return np.full(len(order), np.nan)
+    return pd.to_numeric(df[name]).to_numpy(dtype=float, na_value=np.nan)[order]
+
+
+def _normalized_names(names):
+    """Upper-cased, stripped names with every unnamed marker folded into 'UNNAMED' (as the storm index does)."""
+    names = pd.Series(names, dtype=object).fillna('').astype(str).str.strip().str.upper()
+    return names.where(~names.isin(UNNAMED_NAMES), 'UNNAMED').to_numpy(dtype=str)
+
+
+def compute_metrics(df):
+    """The metrics table (indexed by SID, in archive order) of every storm in ``df``.
+
+    ``df`` needs SID, SEASON, NAME, ISO_TIME, LAT and LON; the metrics that depend
+    on a missing NATURE, USA_WIND, USA_PRES, USA_SSHS or DIST2LAND column are NaN
+    (ACE counts every synoptic fix when NATURE is absent).  Only fixes with a
+    time and a position count.
+    """
+    codes, sids = pd.factorize(df['SID'].to_numpy())
+    times = df['ISO_TIME'].to_numpy(dtype='datetime64[ns]')
+    lat = df['LAT'].to_numpy(dtype=float, na_value=np.nan)
+    lon = df['LON'].to_numpy(dtype=float, na_value=np.nan)
+    valid = np.flatnonzero((codes >= 0) & ~np.isnat(times) & ~np.isnan(lat) & ~np.isnan(lon))
+    # Every storm's fixes as one contiguous, time-ordered block
+    order = valid[np.lexsort((times[valid], codes[valid]))]
+    if len(order) == 0:
+        return pd.DataFrame({column: [] for column in COLUMNS}, index=pd.Index([], name='SID'))
+
+    code = codes[order]
+    starts = np.flatnonzero(np.r_[True, code[1:] != code[:-1]])
+    stops = np.r_[starts[1:], len(order)]
+    storms = len(starts)
+    group = np.repeat(np.arange(storms), stops - starts)
+    lat, lon = lat[order], lon[order]
+    minutes = times[order].astype('datetime64[m]').astype(np.int64)
+
+    wind = _float_column(df, 'USA_WIND', order)
+    pressure = _float_column(df, 'USA_PRES', order)
+    sshs = _float_column(df, 'USA_SSHS', order)
+    dist2land = _float_column(df, 'DIST2LAND', order)
+    tropical = df['NATURE'].isin(ACE_NATURES).to_numpy()[order] if 'NATURE' in df else np.ones(len(order), dtype=bool)
+
+    # Accumulated cyclone energy, in units of 10^4 kt^2
+    counted = (minutes % SYNOPTIC_MINUTES == 0) & tropical & (wind >= ACE_MIN_WIND)
+    ace = np.bincount(group, weights=np.where(counted, wind ** 2 / 1e4, 0.0), minlength=storms)
+
+    # Consecutive fixes of one storm: distance, elapsed time and forward speed
+    pair = np.flatnonzero(group[1:] == group[:-1])
+    pair_group = group[pair]
+    hours = (minutes[pair + 1] - minutes[pair]) / 60.0
+    distance = haversine_km(lon[pair], lat[pair], lon[pair + 1], lat[pair + 1])
+    track_km = np.bincount(pair_group, weights=distance, minlength=storms)
+    moving_hours = np.bincount(pair_group, weights=hours, minlength=storms)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(hours > 0, distance / hours / KM_PER_NAUTICAL_MILE, np.nan)
+        mean_speed = np.where(moving_hours > 0, track_km / moving_hours / KM_PER_NAUTICAL_MILE, np.nan)
+    max_speed = np.full(storms, np.nan)
+    np.fmax.at(max_speed, pair_group, speed)
+
+    # Wind change to the fix exactly 24 hours later, found with one sorted search over
+    # (storm, time) keys spaced so that no target spills into the next storm
+    offset = minutes - minutes.min()
+    key = group * (int(offset.max()) + RI_WINDOW_MINUTES + 1) + offset
+    later = np.minimum(np.searchsorted(key, key + RI_WINDOW_MINUTES), len(key) - 1)
+    change = np.where(key[later] == key + RI_WINDOW_MINUTES, wind[later] - wind, np.nan)
+    max_change = np.full(storms, np.nan)
+    np.fmax.at(max_change, group, change)
+    rapid = change >= RI_THRESHOLD
+    previous_rapid = np.r_[False, rapid[:-1] & (group[1:] == group[:-1])]
+    ri_episodes = np.bincount(group, weights=rapid & ~previous_rapid, minlength=storms)
+
+    # Landfall: over land (DIST2LAND 0) after a fix over water
+    over_land = dist2land == 0
+    previous_over_water = np.r_[False, (dist2land[:-1] > 0) & (group[1:] == group[:-1])]
+    landfalls = np.bincount(group, weights=over_land & previous_over_water, minlength=storms)
+    land_hours = np.bincount(pair_group, weights=np.where(over_land[pair], hours, 0.0), minlength=storms)
+
+    start = times[order][starts]
+    end = times[order][stops - 1]
+    with np.errstate(invalid='ignore'):
+        table = pd.DataFrame({
+            'name': _normalized_names(df['NAME'].to_numpy()[order][starts]),
+            'season': df['SEASON'].to_numpy(dtype=float, na_value=np.nan)[order][starts],
+            'start': start,
+            'end': end,
+            'fixes': stops - starts,
+            'duration_hours': (end - start) / np.timedelta64(1, 'h'),
+            'peak_wind': np.fmax.reduceat(wind, starts),
+            'min_pressure': np.fmin.reduceat(pressure, starts),
+            'peak_sshs': np.fmax.reduceat(sshs, starts),
+            'ace': ace,
+            'ri_episodes': ri_episodes.astype(np.int64),
+            'max_24h_intensification': max_change,
+            'track_km': track_km,
+            'mean_speed_kt': mean_speed,
+            'max_speed_kt': max_speed,
+            'landfalls': landfalls.astype(np.int64),
+            'land_hours': land_hours,
+        }, index=pd.Index(np.asarray(sids, dtype=str)[code[starts]], name='SID'))
+    return table
+
+
+def save_metrics(metrics, path):
+    """Write the metrics table to ``path`` (``.npz``) with the archive fingerprint in its ``attrs``."""
+    meta = {'sha256': metrics.attrs.get('sha256'), 'rows': metrics.attrs.get('rows')}
+    arrays = {column: metrics[column].to_numpy() for column in COLUMNS}
+    arrays['name'] = arrays['name'].astype(str)
+    tmp = str(path) + '.tmp.npz'
+    np.savez(tmp, meta=np.array(json.dumps(meta)), sid=metrics.index.to_numpy(dtype=str), **arrays)
+    os.replace(tmp, path)
+
+
+def read_metrics(path):
+    """The metrics table stored at ``path``, with the archive's ``sha256`` and ``rows`` in its ``attrs``."""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        metrics = pd.DataFrame({column: data[column] for column in COLUMNS},
+                               index=pd.Index(data['sid'], name='SID'))
+    metrics.attrs.update(meta)
+    return metrics
+
+
+def _build_metrics(df, sha256):
+    metrics = compute_metrics(df)
+    metrics.attrs.update(sha256=sha256, rows=len(df))
+    return metrics
+
+
+def load_metrics(source, cache_dir=CACHE_DIR):
+    """The metrics table of ``source``, read from its column cache or computed and stored there."""
+    return cached_artifact(source, METRICS_FILE, METRIC_COLUMNS, _build_metrics, read_metrics,
+                           stamp=lambda metrics: (metrics.attrs.get('sha256'), metrics.attrs.get('rows')),
+                           save=save_metrics, cache_dir=cache_dir)
+
+
+def _summary_frame(metrics):
+    return metrics.assign(
+        season=metrics['season'].astype('Int16'),
+        hurricane=metrics['peak_sshs'] >= 1,
+        major=metrics['peak_sshs'] >= 3,
+        rapid=metrics['ri_episodes'] > 0,
+        landfalling=metrics['landfalls'] > 0,
+    )
+
+
+_SUMMARY_AGGREGATES = {
+    'storms': ('name', 'size'),
+    'hurricanes': ('hurricane', 'sum'),
+    'major_hurricanes': ('major', 'sum'),
+    'ace': ('ace', 'sum'),
+    'rapid_intensifiers': ('rapid', 'sum'),
+    'landfalling_storms': ('landfalling', 'sum'),
+    'landfalls': ('landfalls', 'sum'),
+    'peak_wind': ('peak_wind', 'max'),
+    'min_pressure': ('min_pressure', 'min'),
+}
+
+
+def season_summary(metrics):
+    """Per-season counts (storms, hurricanes, majors, rapid intensifiers, landfalls), total ACE and extremes."""
+    return _summary_frame(metrics).groupby('season').agg(**_SUMMARY_AGGREGATES)
+
+
+def archive_summary(metrics):
+    """The :func:`season_summary` aggregates over the whole table, plus the number of seasons."""
+    summary = _summary_frame(metrics).assign(archive=0).groupby('archive').agg(**_SUMMARY_AGGREGATES).iloc[0]
+    summary['seasons'] = metrics['season'].nunique()
+    return summary
+
+
+def peak_label(peak_sshs):
+    """Saffir-Simpson label of a storm's peak ``USA_SSHS`` value."""
+    if pd.isna(peak_sshs):
+        return 'N/A'
+    if peak_sshs >= 1:
+        return f'Category {int(peak_sshs)}'
+    if peak_sshs == 0:
+        return 'Tropical Storm'
+    if peak_sshs == -1:
+        return 'Tropical Depression'
+    return 'Not designated'
+
+
+def _count(number, noun):
+    return f"{number} {noun}{'' if number == 1 else 's'}"
+
+
+def describe(row):
+    """A short description of one storm from its row of the metrics table."""
+    peak = peak_label(row['peak_sshs'])
+    if peak.startswith('Category'):
+        kind, intensity = 'Hurricane', f"a {peak} hurricane"
+    elif peak in ('Tropical Storm', 'Tropical Depression'):
+        kind, intensity = peak, f"a {peak.lower()}"
+    else:
+        kind, intensity = 'Storm', None
+
+    sentences = []
+    details = []
+    if not pd.isna(row['peak_wind']):
+        details.append(f"{int(row['peak_wind'])} kt winds")
+    if not pd.isna(row['min_pressure']):
+        details.append(f"a minimum pressure of {int(row['min_pressure'])} hPa")
+    if intensity or details:
+        sentences.append(f"{kind} {row['name']} peaked" + (f" as {intensity}" if intensity else '')
+                         + (f" with {' and '.join(details)}" if details else '') + '.')
+    else:
+        sentences.append(f"{kind} {row['name']} has no recorded intensity.")
+
+    sentences.append(f"It was tracked for {row['duration_hours'] / 24:.1f} days over {row['track_km']:,.0f} km"
+                     + (f" at {row['mean_speed_kt']:.0f} kt on average" if not pd.isna(row['mean_speed_kt']) else '')
+                     + f" and generated {row['ace']:.1f} units of accumulated cyclone energy.")
+
+    if row['ri_episodes'] > 0:
+        episodes = int(row['ri_episodes'])
+        sentences.append(f"It rapidly intensified {'once' if episodes == 1 else f'{episodes} times'}, "
+                         f"gaining up to {int(row['max_24h_intensification'])} kt in 24 hours.")
+    if row['landfalls'] > 0:
+        sentences.append(f"It made {_count(int(row['landfalls']), 'landfall')} "
+                         f"and spent {row['land_hours']:.0f} hours over land.")
+    return ' '.join(sentences)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute per-storm metrics and season summaries for an IBTrACS file.')
+    parser.add_argument('--data', default=OUTPUT_FILE, help='IBTrACS or extracted CSV file to read')
+    parser.add_argument('--season', type=int, help='list the storms of this season')
+    parser.add_argument('--top', type=int, default=10, help='number of seasons (or storms) to list, by ACE')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    metrics = load_metrics(args.data)
+    print(f"Metrics for {len(metrics)} storms ready in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    seasons = season_summary(metrics)
+    summary = archive_summary(metrics)
+    elapsed = (time.perf_counter() - start) * 1000
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        if args.season is not None:
+            storms = metrics[metrics['season'] == args.season].sort_values('ace', ascending=False)
+            print(storms.head(args.top)[['name', 'peak_wind', 'min_pressure', 'peak_sshs', 'ace',
+                                         'ri_episodes', 'landfalls']].to_string())
+        else:
+            print(seasons.sort_values('ace', ascending=False).head(args.top).to_string())
+        print(summary.to_string())
+    print(f"Season and archive summaries computed in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compact encodings for track coordinates and pre-compressed output files.
+
+Track positions are stored as fixed-point integers (hundredths of a degree by
+default, finer than IBTrACS' 0.1 degree positions), delta-encoded so that
+consecutive fixes become small numbers, packed into a little-endian typed
+array and base64-encoded.  :data:`DECODE_COORDINATES_JS` turns that back into
+``[lat, lon]`` pairs in the page.
+
+:func:`write_compressed` writes ``.gz`` (and, if the optional ``brotli``
+package is installed, ``.br``) siblings of an output file so a static server
+can serve them directly.
+"""
+import base64
+import gzip
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for .br output
+    brotli = None
+
+# Fixed-point scale: 100 stores coordinates to 0.01 degrees
+COORD_SCALE = 100
+
+_INT16 = np.iinfo(np.int16)
+
+
+def encode_coordinates(lon, lat, scale=COORD_SCALE):
+    """Encode a track as ``{'scale', 'type', 'data'}`` with delta-encoded fixed-point coordinates.
+
+    ``data`` is base64 of interleaved ``[x0, y0, dx1, dy1, ...]`` values, where
+    the first pair is the absolute position and every later pair is the change
+    from the previous point.  Values are int16 unless a jump (e.g. across the
+    dateline) needs int32; ``type`` records which.
+    """
+    xy = np.column_stack([np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)])
+    fixed = np.rint(xy * scale).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+
+    dtype = '<i2' if len(deltas) == 0 or (deltas.min() >= _INT16.min and deltas.max() <= _INT16.max) else '<i4'
+    return {
+        'scale': scale,
+        'type': 'i2' if dtype == '<i2' else 'i4',
+        'data': base64.b64encode(deltas.astype(dtype).tobytes()).decode('ascii'),
+    }
+
+
+def decode_coordinates(encoded):
+    """Inverse of :func:`encode_coordinates`: returns ``(lon, lat)`` float arrays."""
+    dtype = '<i2' if encoded['type'] == 'i2' else '<i4'
+    deltas = np.frombuffer(base64.b64decode(encoded['data']), dtype=dtype).astype(np.int64)
+    fixed = np.cumsum(deltas.reshape(-1, 2), axis=0)
+    lonlat = fixed / encoded['scale']
+    return lonlat[:, 0], lonlat[:, 1]
+
+
+# Page-side decoder: hurricaneDecodeCoordinates(encoded) -> [[lat, lon], ...]
+DECODE_COORDINATES_JS = """
+function hurricaneDecodeCoordinates(encoded) {
+    var bytes = Uint8Array.from(atob(encoded.data), function(c) { return c.charCodeAt(0); });
+    var view = new DataView(bytes.buffer), size = encoded.type === 'i2' ? 2 : 4;
+    var latlngs = [], x = 0, y = 0;
+    for (var offset = 0; offset < bytes.length; offset += 2 * size) {
+        x += size === 2 ? view.getInt16(offset, true) : view.getInt32(offset, true);
+        y += size === 2 ? view.getInt16(offset + size, true) : view.getInt32(offset + size, true);
+        latlngs.push([y / encoded.scale, x / encoded.scale]);
+    }
+    return latlngs;
+}
+"""
+
+
+def write_compressed(path):
+    """Write ``path.gz`` and, when ``brotli`` is available, ``path.br``, yielding each file once written.
+
+    A skipped ``.br`` copy is reported, so a missing ``brotli`` does not go unnoticed.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    # mtime=0 keeps the .gz byte-identical across builds of the same page
+    with open(f"{path}.gz", 'wb') as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    yield f"{path}.gz"
+
+    if brotli is None:
+        print(f"Skipped {path}.br: install the optional brotli package to write it")
+        return
+    with open(f"{path}.br", 'wb') as f:
+        f.write(brotli.compress(content, quality=11))
+    yield f"{path}.br"
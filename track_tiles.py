@@ -0,0 +1,306 @@
+"""Level-of-detail tile pyramid of storm tracks for full-archive maps.
+
+Every storm in the input is simplified once with Douglas-Peucker, recording
+for each fix the tolerance at which it would be dropped.  For each zoom level
+the tracks are then cut at a tolerance of about one screen pixel and their
+segments are clipped to the standard Web Mercator ``z/x/y`` tiles they cross,
+so each piece of a track is drawn by exactly one tile, and written as small
+GeoJSON files next to a viewer page.  Segments crossing the antimeridian are
+split there rather than drawn across the whole map.  The viewer only fetches
+tiles that are visible at the current zoom and extent and drops them again when
+they scroll away, so client memory stays bounded even with every storm since
+1851 on the map.
+
+Usage::
+
+    python track_tiles.py --data ibtracs.NA.list.v04r01.csv --output track_tiles
+
+Serve the output directory over HTTP (for example ``python -m http.server``)
+and open its ``index.html``; browsers do not allow the page to fetch tiles
+from ``file://`` URLs.
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from extract_hurricane_data import OUTPUT_FILE
+from geometry import clip_segments, douglas_peucker_importance, inverse_mercator, mercator, pixel_size
+from ibtracs_cache import load_ibtracs
+from storm_layers import cat_colors
+
+TILES_DIR = 'track_tiles'
+MANIFEST_FILE = 'tiles.json'
+
+TILE_COLUMNS = ['SID', 'SEASON', 'NAME', 'ISO_TIME', 'LAT', 'LON', 'USA_SSHS']
+
+DEFAULT_MIN_ZOOM = 2
+DEFAULT_MAX_ZOOM = 8
+# Simplification tolerance, in screen pixels at each zoom level
+DEFAULT_PIXEL_TOLERANCE = 1.0
+
+# Decimal places kept for tile coordinates (0.01 degrees, finer than IBTrACS positions)
+COORD_DECIMALS = 2
+
+
+def load_tracks(data_file, since=None, until=None):
+    """All valid fixes of the storms in ``data_file``, grouped by storm and sorted by time.
+
+    Returns the frame plus the ``(start, stop)`` row range of every storm in it.
+    """
+    df = load_ibtracs(data_file, columns=TILE_COLUMNS)
+    valid = df['SID'].notna() & df['LAT'].notna() & df['LON'].notna() & df['ISO_TIME'].notna()
+    # Storms with no season are only kept when no season range is asked for
+    if since is not None:
+        valid &= (df['SEASON'] >= since).fillna(False)
+    if until is not None:
+        valid &= (df['SEASON'] <= until).fillna(False)
+    df = df[valid].sort_values(['SID', 'ISO_TIME'], kind='stable').reset_index(drop=True)
+
+    codes = pd.factorize(df['SID'].to_numpy())[0]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=int)
+    stops = np.r_[starts[1:], len(codes)]
+    return df, np.column_stack([starts, stops])
+
+
+def track_importance(x, y, storms):
+    """Douglas-Peucker importance of every fix, computed independently for each storm."""
+    importance = np.empty(len(x))
+    for start, stop in storms:
+        importance[start:stop] = douglas_peucker_importance(x[start:stop], y[start:stop])
+    return importance
+
+
+def zoom_segments(importance, storm_of_point, category, tolerance):
+    """Segments ``(a, b, category)`` of the tracks simplified at ``tolerance``.
+
+    ``a`` and ``b`` are indices of consecutive surviving fixes of one storm; a
+    segment takes the highest category of the original fixes it replaces.
+    """
+    kept = np.flatnonzero(importance > tolerance)
+    a = kept[:-1]
+    b = kept[1:]
+    same_storm = storm_of_point[a] == storm_of_point[b]
+    a = a[same_storm]
+    b = b[same_storm]
+    if len(a) == 0:
+        return a, b, np.empty(0, dtype=int)
+    # Maximum over [a, b) for every segment: reduceat over interleaved bounds, keeping even slots
+    peak = np.maximum.reduceat(category, np.ravel(np.column_stack([a, b])))[::2]
+    return a, b, peak
+
+
+def tile_assignments(xa, ya, xb, yb, zoom):
+    """Expand segments into ``(segment, tile_x, tile_y)`` for every tile their bounding box touches."""
+    n = 2 ** zoom
+    tx0 = np.clip(np.floor(np.minimum(xa, xb) * n), 0, n - 1).astype(np.int64)
+    tx1 = np.clip(np.floor(np.maximum(xa, xb) * n), 0, n - 1).astype(np.int64)
+    ty0 = np.clip(np.floor(np.minimum(ya, yb) * n), 0, n - 1).astype(np.int64)
+    ty1 = np.clip(np.floor(np.maximum(ya, yb) * n), 0, n - 1).astype(np.int64)
+
+    width = tx1 - tx0 + 1
+    counts = width * (ty1 - ty0 + 1)
+    segment = np.repeat(np.arange(len(xa)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_x = tx0[segment] + offset % width[segment]
+    tile_y = ty0[segment] + offset // width[segment]
+    return segment, tile_x, tile_y
+
+
+def build_zoom(df, storms, importance, x, y, zoom, pixel_tolerance):
+    """``{(tile_x, tile_y): FeatureCollection}`` for one zoom level."""
+    storm_of_point = np.repeat(np.arange(len(storms)), storms[:, 1] - storms[:, 0])
+    category = pd.to_numeric(df['USA_SSHS'], errors='coerce').fillna(-3).astype(int).to_numpy()
+    a, b, peak = zoom_segments(importance, storm_of_point, category, pixel_tolerance * pixel_size(zoom))
+
+    # A segment jumping more than half the world crosses the antimeridian: unwrap it, and
+    # add a copy shifted a world the other way; clipping to the tiles then keeps the part
+    # of each copy that is on the map, splitting the segment at +/-180 degrees
+    wrap = np.round(x[b] - x[a])
+    crossing = np.flatnonzero(wrap != 0)
+    copies = np.r_[np.arange(len(a)), crossing]
+    shifted = np.r_[np.zeros(len(a), dtype=bool), np.ones(len(crossing), dtype=bool)]
+    x0 = np.r_[x[a], x[a][crossing] + wrap[crossing]]
+    x1 = np.r_[x[b] - wrap, x[b][crossing]]
+    y0, y1 = y[a][copies], y[b][copies]
+
+    # Clip every segment to each tile it is assigned to, so a segment spanning several
+    # tiles is drawn once, in pieces, rather than whole by each of them
+    piece, tile_x, tile_y = tile_assignments(x0, y0, x1, y1, zoom)
+    n = 2 ** zoom
+    xa, ya, xb, yb = x0[piece], y0[piece], x1[piece], y1[piece]
+    enter, leave, hit = clip_segments(xa, ya, xb, yb, tile_x / n, tile_y / n, (tile_x + 1) / n, (tile_y + 1) / n)
+    # Tiles the bounding box touches but the segment misses, or only grazes at a corner or edge
+    keep = np.flatnonzero(hit & ((enter < leave) | ((xa == xb) & (ya == yb))))
+    order = keep[np.lexsort((shifted[piece][keep], copies[piece][keep], tile_y[keep], tile_x[keep]))]
+    segment, tile_x, tile_y = copies[piece][order], tile_x[order], tile_y[order]
+    enter, leave = enter[order], leave[order]
+    xa, ya, xb, yb = xa[order], ya[order], xb[order], yb[order]
+    if len(segment) == 0:
+        return {}
+
+    # A new chain starts with each tile, each storm, each gap, each category change and
+    # wherever a track leaves the tile (or the map) and comes back
+    new_tile = np.r_[True, (tile_x[1:] != tile_x[:-1]) | (tile_y[1:] != tile_y[:-1])]
+    seg_a, seg_b, seg_cat = a[segment], b[segment], peak[segment]
+    breaks = new_tile | np.r_[True, (seg_a[1:] != seg_b[:-1]) | (seg_cat[1:] != seg_cat[:-1])
+                              | (leave[:-1] < 1) | (enter[1:] > 0)]
+    chain_starts = np.flatnonzero(breaks)
+    chain_stops = np.r_[chain_starts[1:], len(segment)]
+
+    # Where each clipped piece starts and ends; inside a chain every piece starts where the last ended
+    piece_starts = np.column_stack(inverse_mercator(xa + (xb - xa) * enter, ya + (yb - ya) * enter))
+    piece_ends = np.column_stack(inverse_mercator(xa + (xb - xa) * leave, ya + (yb - ya) * leave))
+    piece_starts, piece_ends = piece_starts.round(COORD_DECIMALS), piece_ends.round(COORD_DECIMALS)
+    sids = df['SID'].astype(str).to_numpy()
+    names = df['NAME'].astype(str).to_numpy()
+    seasons = df['SEASON'].to_numpy(dtype=float, na_value=np.nan)
+
+    tiles = {}
+    for start, stop in zip(chain_starts, chain_stops):
+        first = seg_a[start]
+        key = (int(tile_x[start]), int(tile_y[start]))
+        tiles.setdefault(key, []).append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [piece_starts[start].tolist()] + piece_ends[start:stop].tolist(),
+            },
+            'properties': {
+                'sid': sids[first],
+                'name': names[first],
+                'season': None if np.isnan(seasons[first]) else int(seasons[first]),
+                'cat': int(seg_cat[start]),
+            },
+        })
+    return {key: {'type': 'FeatureCollection', 'features': features} for key, features in tiles.items()}
+
+
+def _prepare_output(output_dir):
+    """Clear a previous pyramid from ``output_dir``; refuse to touch any other non-empty directory."""
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        if not os.path.exists(os.path.join(output_dir, MANIFEST_FILE)):
+            raise FileExistsError(f"{output_dir} is not empty and does not hold a track tile pyramid")
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+
+def build_pyramid(data_file, output_dir=TILES_DIR, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                  pixel_tolerance=DEFAULT_PIXEL_TOLERANCE, since=None, until=None):
+    """Write the tile pyramid, its manifest and the viewer page for the storms in ``data_file``."""
+    print(f"Loading tracks from {data_file}...")
+    df, storms = load_tracks(data_file, since, until)
+    print(f"Simplifying {len(storms)} storms ({len(df)} fixes)...")
+    x, y = mercator(df['LON'].to_numpy(dtype=float), df['LAT'].to_numpy(dtype=float))
+    importance = track_importance(x, y, storms)
+
+    _prepare_output(output_dir)
+    manifest = {'min_zoom': min_zoom, 'max_zoom': max_zoom, 'storms': len(storms), 'tiles': {}}
+    for zoom in range(min_zoom, max_zoom + 1):
+        tiles = build_zoom(df, storms, importance, x, y, zoom, pixel_tolerance)
+        for (tile_x, tile_y), collection in tiles.items():
+            tile_dir = os.path.join(output_dir, str(zoom), str(tile_x))
+            os.makedirs(tile_dir, exist_ok=True)
+            # json.dumps uses the C encoder; json.dump streams through the pure-Python one
+            with open(os.path.join(tile_dir, f"{tile_y}.json"), 'w') as f:
+                f.write(json.dumps(collection, separators=(',', ':')))
+        manifest['tiles'][str(zoom)] = sorted(f"{tile_x}/{tile_y}" for tile_x, tile_y in tiles)
+        vertices = sum(len(feature['geometry']['coordinates'])
+                       for collection in tiles.values() for feature in collection['features'])
+        print(f"Zoom {zoom}: {len(tiles)} tiles, {vertices} vertices")
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write(VIEWER_HTML.replace('__CAT_COLORS__', json.dumps({str(k): v for k, v in cat_colors.items()})))
+    print(f"Tile pyramid saved to {output_dir}")
+
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Hurricane Tracks</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map { height: 100%; margin: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var CAT_COLORS = __CAT_COLORS__;
+
+fetch('tiles.json').then(function(response) { return response.json(); }).then(function(manifest) {
+    var map = L.map('map', {minZoom: manifest.min_zoom}).setView([25, -70], 4);
+    L.tileLayer('https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png', {
+        attribution: '&copy; OpenStreetMap contributors &copy; CARTO'
+    }).addTo(map);
+
+    var available = {};
+    Object.keys(manifest.tiles).forEach(function(z) { available[z] = new Set(manifest.tiles[z]); });
+    var loaded = {};
+
+    // Grid layer whose tiles are empty divs; each visible tile fetches its tracks as GeoJSON
+    var TrackTiles = L.GridLayer.extend({
+        createTile: function(coords, done) {
+            var tile = document.createElement('div');
+            var key = coords.z + '/' + coords.x + '/' + coords.y;
+            if (!available[coords.z] || !available[coords.z].has(coords.x + '/' + coords.y)) {
+                setTimeout(function() { done(null, tile); }, 0);
+                return tile;
+            }
+            fetch(key + '.json').then(function(response) { return response.json(); }).then(function(data) {
+                if (tile.isConnected) {
+                    loaded[key] = L.geoJSON(data, {
+                        style: function(feature) {
+                            return {color: CAT_COLORS[feature.properties.cat] || 'gray', weight: 2, opacity: 0.8};
+                        },
+                        onEachFeature: function(feature, layer) {
+                            var season = feature.properties.season;
+                            layer.bindTooltip(feature.properties.name + (season === null ? '' : ' (' + season + ')'), {sticky: true});
+                        }
+                    }).addTo(map);
+                }
+                done(null, tile);
+            }, function(error) { done(error, tile); });
+            return tile;
+        }
+    });
+
+    var tracks = new TrackTiles({minNativeZoom: manifest.min_zoom, maxNativeZoom: manifest.max_zoom});
+    tracks.on('tileunload', function(e) {
+        var key = e.coords.z + '/' + e.coords.x + '/' + e.coords.y;
+        if (loaded[key]) {
+            map.removeLayer(loaded[key]);
+            delete loaded[key];
+        }
+    });
+    tracks.addTo(map);
+});
+</script>
+</body>
+</html>
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a level-of-detail tile pyramid of storm tracks.')
+    parser.add_argument('--data', default=OUTPUT_FILE, help='IBTrACS or extracted CSV file to read')
+    parser.add_argument('--output', default=TILES_DIR, help='directory to write the tiles and viewer to')
+    parser.add_argument('--min-zoom', type=int, default=DEFAULT_MIN_ZOOM)
+    parser.add_argument('--max-zoom', type=int, default=DEFAULT_MAX_ZOOM)
+    parser.add_argument('--pixel-tolerance', type=float, default=DEFAULT_PIXEL_TOLERANCE,
+                        help='simplification tolerance in screen pixels')
+    parser.add_argument('--since', type=int, help='first season to include')
+    parser.add_argument('--until', type=int, help='last season to include')
+    args = parser.parse_args(argv)
+
+    build_pyramid(args.data, args.output, args.min_zoom, args.max_zoom, args.pixel_tolerance,
+                  args.since, args.until)
+
+
+if __name__ == '__main__':
+    main()